@@ -1,14 +1,14 @@
 import asyncio
 from collections import OrderedDict
 from dataclasses import dataclass, field
-import time, importlib, inspect, os, json
+import time, importlib, inspect, os, json, threading
 import token
 from typing import Any, Awaitable, Coroutine, Optional, Dict, TypedDict
 import uuid
 import models
 
 from langchain_core.prompt_values import ChatPromptValue
-from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens
+from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens, change_signal
 from python.helpers.print_style import PrintStyle
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
@@ -18,12 +18,15 @@ from langchain_core.embeddings import Embeddings
 import python.helpers.log as Log
 from python.helpers.dirty_json import DirtyJson
 from python.helpers.defer import DeferredTask
+from python.helpers.scheduler import Scheduler
+from python.helpers.coalesce import Coalescer
 from typing import Callable
 
 
 class AgentContext:
 
     _contexts: dict[str, "AgentContext"] = {}
+    _hibernated: dict[str, dict[str, Any]] = {}  # metadata of contexts persisted on disk only
     _counter: int = 0
 
     def __init__(
@@ -42,34 +45,127 @@ class AgentContext:
         self.config = config
         self.log = log or Log.Log()
         self.agent0 = agent0 or Agent(0, self.config, self)
-        self.paused = paused
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._waiters_lock = threading.Lock()
+        self._paused = paused
         self.streaming_agent = streaming_agent
         self.task: DeferredTask | None = None
+        self.last_active = time.time()
         AgentContext._counter += 1
         self.no = AgentContext._counter
 
         existing = self._contexts.get(self.id, None)
         if existing:
             AgentContext.remove(self.id)
+        AgentContext._hibernated.pop(self.id, None)  # loaded again, listed as live only
         self._contexts[self.id] = self
+        change_signal.notify()
 
     @staticmethod
     def get(id: str):
-        return AgentContext._contexts.get(id, None)
+        context = AgentContext._contexts.get(id, None)
+        if not context and id in AgentContext._hibernated:
+            from python.helpers import hibernation
+
+            context = hibernation.rehydrate(id)
+        if context:
+            context.last_active = time.time()
+        return context
 
     @staticmethod
     def first():
-        if not AgentContext._contexts:
-            return None
-        return list(AgentContext._contexts.values())[0]
+        if AgentContext._contexts:
+            return list(AgentContext._contexts.values())[0]
+        if AgentContext._hibernated:
+            return AgentContext.get(next(iter(AgentContext._hibernated)))
+        return None
+
+    @staticmethod
+    def all_metadata() -> list[dict[str, Any]]:
+        # live and hibernated contexts, in order of creation
+        metadata = [ctx.metadata() for ctx in list(AgentContext._contexts.values())]
+        metadata += list(AgentContext._hibernated.values())
+        return sorted(metadata, key=lambda m: m["no"])
 
     @staticmethod
     def remove(id: str):
+        AgentContext._hibernated.pop(id, None)
         context = AgentContext._contexts.pop(id, None)
         if context and context.task:
             context.task.kill()
+        Scheduler.get().release(id)
+        change_signal.notify()
         return context
 
+    def metadata(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "no": self.no,
+            "name": self.name,
+            "log_guid": self.log.guid,
+            "log_version": self.log.version,
+            "log_length": len(self.log.logs),
+            "paused": self.paused,
+            "last_active": self.last_active,
+        }
+
+    def is_running(self) -> bool:
+        return bool(self.task and self.task.is_alive())
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        with self._waiters_lock:
+            self._paused = value
+        self.notify()
+        change_signal.notify()
+
+    def notify(self):
+        # wake up coroutines waiting for pause or intervention changes, safe to call from any thread
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve_future, future)
+
+    async def wait_if_paused(self):
+        while self._paused:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._waiters_lock:
+                if not self._paused:
+                    return
+                self._waiters.append((loop, future))
+            await future
+
+    async def wait_for_signal(self, timeout: float | None = None) -> bool:
+        # wait for the next pause or intervention change, returns False on timeout
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            with self._waiters_lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            return False
+
+    def get_agents(self) -> list["Agent"]:
+        # all agents of the context, superiors before their subordinates
+        agents = []
+        stack = [self.agent0]
+        while stack:
+            agent = stack.pop()
+            agents.append(agent)
+            stack.extend(reversed(agent.get_subordinates()))
+        return agents
+
     def kill_process(self):
         if self.task:
             self.task.kill()
@@ -89,8 +185,8 @@ class AgentContext:
         else:
             current_agent = self.agent0
 
-        self.process = DeferredTask(current_agent.monologue)
-        return self.process
+        self.task = self.run_task(current_agent.monologue)
+        return self.task
     def communicate(self, msg: "UserMessage", broadcast_level: int = 1):
         self.paused = False  # unpause if paused
 
@@ -100,14 +196,17 @@ class AgentContext:
             current_agent = self.agent0
 
         if self.task and self.task.is_alive():
-            # set intervention messages to agent(s):
-            intervention_agent = current_agent
-            while intervention_agent and broadcast_level != 0:
-                intervention_agent.intervention = msg
+            # set intervention messages to agent(s), parallel subordinates get one each
+            intervention_agents = current_agent.get_data(Agent.DATA_NAME_FAN_OUT) or [
+                current_agent
+            ]
+            while intervention_agents and broadcast_level != 0:
+                for intervention_agent in intervention_agents:
+                    intervention_agent.intervention = msg
                 broadcast_level -= 1
-                intervention_agent = intervention_agent.data.get(
-                    Agent.DATA_NAME_SUPERIOR, None
-                )
+                superior = intervention_agents[0].data.get(Agent.DATA_NAME_SUPERIOR, None)
+                intervention_agents = [superior] if superior else []
+            self.notify()
         else:
             self.task = self.run_task(self._process_chain, current_agent, msg)
 
@@ -116,11 +215,16 @@ class AgentContext:
     def run_task(
         self, func: Callable[..., Coroutine[Any, Any, Any]], *args: Any, **kwargs: Any
     ):
-        if not self.task:
-            self.task = DeferredTask(
-                thread_name=self.__class__.__name__,
-            )
-        self.task.start_task(func, *args, **kwargs)
+        from python.helpers import hibernation
+
+        with hibernation.lock:
+            hibernation.wake(self)
+            self.last_active = time.time()
+            # idle contexts are (re)placed on the least loaded event loop thread
+            scheduler = Scheduler.get()
+            if not self.task or not self.task.is_alive():
+                self.task = scheduler.create_task(self.id)
+            scheduler.start_task(self.id, self.task, func, *args, **kwargs)
         return self.task
 
     # this wrapper ensures that superior agents are called back if the chat was loaded from file and original callstack is gone
@@ -142,6 +246,20 @@ class AgentContext:
             agent.handle_critical_exception(e)
 
 
+def _resolve_future(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _is_tool_call(call: Any) -> bool:
+    return (
+        isinstance(call, dict)
+        and isinstance(call.get("tool_name"), str)
+        and bool(call["tool_name"])
+        and isinstance(call.get("tool_args", {}), dict)
+    )
+
+
 @dataclass
 class ModelConfig:
     provider: models.ModelProvider
@@ -198,6 +316,7 @@ class LoopData:
         self.extras_temporary: OrderedDict[str, history.MessageContent] = OrderedDict()
         self.extras_persistent: OrderedDict[str, history.MessageContent] = OrderedDict()
         self.last_response = ""
+        self.usage: dict[str, int] = {}
 
         # override values with kwargs
         for key, value in kwargs.items():
@@ -222,7 +341,9 @@ class Agent:
 
     DATA_NAME_SUPERIOR = "_superior"
     DATA_NAME_SUBORDINATE = "_subordinate"
-    DATA_NAME_CTX_WINDOW = "ctx_window"
+    DATA_NAME_SUBORDINATES = "_subordinates"  # parallel subordinates from fan-out
+    DATA_NAME_FAN_OUT = "_fan_out"  # parallel subordinates while they are running
+    DATA_NAME_CTX_WINDOW = "_ctx_window"  # rebuilt every iteration, not persisted
 
     def __init__(
         self, number: int, config: AgentConfig, context: AgentContext | None = None
@@ -256,7 +377,8 @@ class Agent:
                 # let the agent run message loop until he stops it with a response tool
                 while True:
 
-                    self.context.streaming_agent = self  # mark self as current streamer
+                    if not self.in_fan_out():
+                        self.context.streaming_agent = self  # mark self as current streamer
                     self.loop_data.iteration += 1
 
                     try:
@@ -274,18 +396,37 @@ class Agent:
                             type="agent", heading=f"{self.agent_name}: Generating"
                         )
 
+                        # resumable parser for the streamed response
+                        parser = DirtyJson()
+                        # parse and log the stream once per window, not per chunk
+                        log_stream = Coalescer(
+                            lambda full: self.log_from_stream(full, log, parser)
+                        )
+
                         async def stream_callback(chunk: str, full: str):
                             # output the agent response stream
                             if chunk:
                                 printer.stream(chunk)
-                                self.log_from_stream(full, log)
+                                log_stream.push(full=full)
 
                         # store as last context window content
                         self.set_data(Agent.DATA_NAME_CTX_WINDOW, prompt.format())
 
-                        agent_response = await self.call_chat_model(
-                            prompt, callback=stream_callback
-                        )
+                        try:
+                            agent_response = await self.call_chat_model(
+                                prompt, callback=stream_callback
+                            )
+                        finally:
+                            log_stream.flush()
+
+                        # report token usage and prompt cache hits
+                        if self.loop_data.usage:
+                            log.update(
+                                **{
+                                    f"tokens_{key}": value
+                                    for key, value in self.loop_data.usage.items()
+                                }
+                            )
 
                         await self.handle_intervention(agent_response)
 
@@ -335,7 +476,8 @@ class Agent:
             except Exception as e:
                 self.handle_critical_exception(e)
             finally:
-                self.context.streaming_agent = None  # unset current streamer
+                if self.context.streaming_agent is self:
+                    self.context.streaming_agent = None  # unset current streamer
                 # call monologue_end extensions
                 await self.call_extensions("monologue_end", loop_data=self.loop_data)  # type: ignore
 
@@ -361,13 +503,20 @@ class Agent:
         # convert history to LLM format
         history_langchain = history.output_langchain(history_combined)
 
-        # build chain from system prompt, message history and model
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(content="\n\n".join(loop_data.system)),
-                *history_langchain,
-            ]
+        # system prompt and older history form a stable prefix, volatile extras are at the end
+        messages = [
+            SystemMessage(content="\n\n".join(loop_data.system)),
+            *history_langchain,
+        ]
+
+        # mark the end of the system prompt and of the older history for prompt caching
+        breakpoints = [0] if len(messages) < 3 else [0, len(messages) - 2]
+        messages = models.add_cache_breakpoints(
+            self.config.chat_model.provider, messages, breakpoints
         )
+
+        # build chain from system prompt, message history and model
+        prompt = ChatPromptTemplate.from_messages(messages)
         return prompt
 
     def handle_critical_exception(self, exception: Exception):
@@ -409,7 +558,7 @@ class Agent:
         ):  # if agent has custom folder, use it and use default as backup
             prompt_dir = files.get_abs_path("prompts", self.config.prompts_subdir)
             backup_dir.append(files.get_abs_path("prompts/default"))
-        prompt = files.parse_file(
+        prompt = files.parse_template(
             files.get_abs_path(prompt_dir, file), _backup_dirs=backup_dir, **kwargs
         )
         return prompt
@@ -422,12 +571,24 @@ class Agent:
         ):  # if agent has custom folder, use it and use default as backup
             prompt_dir = files.get_abs_path("prompts", self.config.prompts_subdir)
             backup_dir.append(files.get_abs_path("prompts/default"))
-        prompt = files.read_file(
+        prompt = files.render_template(
             files.get_abs_path(prompt_dir, file), _backup_dirs=backup_dir, **kwargs
         )
-        prompt = files.remove_code_fences(prompt)
         return prompt
 
+    def get_subordinates(self) -> list["Agent"]:
+        subordinates = []
+        subordinate = self.get_data(Agent.DATA_NAME_SUBORDINATE)
+        if subordinate:
+            subordinates.append(subordinate)
+        subordinates += self.get_data(Agent.DATA_NAME_SUBORDINATES) or []
+        return subordinates
+
+    def in_fan_out(self) -> bool:
+        # parallel subordinates leave streaming to their superior
+        superior = self.get_data(Agent.DATA_NAME_SUPERIOR)
+        return bool(superior) and self in (superior.get_data(Agent.DATA_NAME_FAN_OUT) or [])
+
     def get_data(self, field: str):
         return self.data.get(field, None)
 
@@ -538,7 +699,9 @@ class Agent:
             await self.handle_intervention()  # wait for intervention and handle it, if paused
 
             content = models.parse_chunk(chunk)
-            limiter.add(output=tokens.approximate_tokens(content))
+            limiter.add(
+                output=tokens.approximate_tokens(content, model=self.config.utility_model.name)
+            )
             response += content
 
             if callback:
@@ -552,6 +715,7 @@ class Agent:
         callback: Callable[[str, str], Awaitable[None]] | None = None,
     ):
         response = ""
+        usage: dict[str, int] = {}
 
         # model class
         model = self.get_chat_model()
@@ -563,12 +727,16 @@ class Agent:
             await self.handle_intervention()  # wait for intervention and handle it, if paused
 
             content = models.parse_chunk(chunk)
-            limiter.add(output=tokens.approximate_tokens(content))
+            models.parse_usage(chunk, usage)
+            limiter.add(
+                output=tokens.approximate_tokens(content, model=self.config.chat_model.name)
+            )
             response += content
 
             if callback:
                 await callback(content, response)
 
+        self.loop_data.usage = usage
         return response
 
     async def rate_limiter(
@@ -598,14 +766,13 @@ class Agent:
             model_config.limit_input,
             model_config.limit_output,
         )
-        limiter.add(input=tokens.approximate_tokens(input))
+        limiter.add(input=tokens.approximate_tokens(input, model=model_config.name))
         limiter.add(requests=1)
         await limiter.wait(callback=wait_callback)
         return limiter
 
     async def handle_intervention(self, progress: str = ""):
-        while self.context.paused:
-            await asyncio.sleep(0.1)  # wait if paused
+        await self.context.wait_if_paused()  # wait if paused
         if (
             self.intervention
         ):  # if there is an intervention message, but not yet processed
@@ -618,40 +785,113 @@ class Agent:
             raise InterventionException(msg)
 
     async def wait_if_paused(self):
-        while self.context.paused:
-            await asyncio.sleep(0.1)
+        await self.context.wait_if_paused()
 
     async def process_tools(self, msg: str):
         # search for tool usage requests in agent message
         tool_request = extract_tools.json_parse_dirty(msg)
 
         if tool_request is not None:
+            tool_calls = tool_request.get("tool_calls", None)
+            if isinstance(tool_calls, list) and tool_calls:
+                # multiple tool requests in one message, asked again if any of them is malformed
+                if all(_is_tool_call(call) for call in tool_calls):
+                    return await self.process_tool_calls(tool_calls, msg)
+                return await self.handle_misformat()
+
             tool_name = tool_request.get("tool_name", "")
             tool_args = tool_request.get("tool_args", {})
             tool = self.get_tool(tool_name, tool_args, msg)
 
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            await tool.before_execution(**tool_args)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            response = await tool.execute(**tool_args)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            await tool.after_execution(response)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
+            response = await self.execute_tool(tool)
             if response.break_loop:
                 return response.message
         else:
-            msg = self.read_prompt("fw.msg_misformat.md")
-            await self.hist_add_warning(msg)
-            PrintStyle(font_color="red", padding=True).print(msg)
-            self.context.log.log(
-                type="error", content=f"{self.agent_name}: Message misformat"
-            )
+            await self.handle_misformat()
+
+    async def handle_misformat(self):
+        msg = self.read_prompt("fw.msg_misformat.md")
+        await self.hist_add_warning(msg)
+        PrintStyle(font_color="red", padding=True).print(msg)
+        self.context.log.log(
+            type="error", content=f"{self.agent_name}: Message misformat"
+        )
+
+    async def process_tool_calls(self, tool_calls: list[dict], msg: str):
+        tools = [
+            self.get_tool(call.get("tool_name", ""), call.get("tool_args", {}), msg)
+            for call in tool_calls
+        ]
+
+        # tools depending on each other or breaking the loop run one by one
+        if not all(tool.parallel for tool in tools):
+            for tool in tools:
+                response = await self.execute_tool(tool)
+                if response.break_loop:
+                    return response.message
+            return None
+
+        # independent tools run concurrently, results are added to history in order
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        for tool in tools:
+            await tool.before_execution(**tool.args)
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        # a failing tool does not discard the results of the others
+        responses = await asyncio.gather(
+            *[tool.execute(**tool.args) for tool in tools], return_exceptions=True
+        )
+        for response in responses:
+            if isinstance(response, BaseException) and not isinstance(response, Exception):
+                raise response  # cancellation
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        intervention = None
+        for tool, response in zip(tools, responses):
+            if isinstance(response, InterventionException):
+                intervention = intervention or response
+            elif isinstance(response, Exception):
+                await self.report_tool_error(tool, response)
+            else:
+                await tool.after_execution(response)
+        if intervention:
+            raise intervention
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        return None
 
-    def log_from_stream(self, stream: str, logItem: Log.LogItem):
+    async def report_tool_error(self, tool, error: Exception):
+        # the error becomes the result of this tool, the model sees which call failed
+        try:
+            raise error
+        except Exception as e:
+            error_message = errors.format_error(e)
+        await self.hist_add_tool_result(tool.name, error_message)
+        PrintStyle(font_color="red", padding=True).print(
+            f"{self.agent_name}: Error in tool '{tool.name}'\n{error_message}"
+        )
+        tool.log.update(content=error_message)
+
+    async def execute_tool(self, tool):
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        await tool.before_execution(**tool.args)
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        response = await tool.execute(**tool.args)
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        await tool.after_execution(response)
+        await self.handle_intervention()  # wait if paused and handle intervention message if needed
+        return response
+
+    def log_from_stream(
+        self, stream: str, logItem: Log.LogItem, parser: DirtyJson | None = None
+    ):
         try:
             if len(stream) < 25:
                 return  # no reason to try
-            response = DirtyJson.parse_string(stream)
+            if parser:
+                # only feed the part of the stream the parser has not seen yet
+                parser.feed(stream[parser.consumed :])
+                # the parser keeps mutating its result, log a copy of the open containers
+                response = parser.snapshot()
+            else:
+                response = DirtyJson.parse_string(stream)
             if isinstance(response, dict):
                 # log if result is a dictionary already
                 logItem.update(content=stream, kvps=response)
@@ -662,7 +902,7 @@ class Agent:
         from python.tools.unknown import Unknown
         from python.helpers.tool import Tool
 
-        classes = extract_tools.load_classes_from_folder(
+        classes = extract_tools.get_classes_from_folder(
             "python/tools", name + ".py", Tool
         )
         tool_class = classes[0] if classes else Unknown
@@ -671,7 +911,7 @@ class Agent:
     async def call_extensions(self, folder: str, **kwargs) -> Any:
         from python.helpers.extension import Extension
 
-        classes = extract_tools.load_classes_from_folder(
+        classes = extract_tools.get_classes_from_folder(
             "python/extensions/" + folder, "*", Extension
         )
         for cls in classes:
@@ -0,0 +1,130 @@
+"""
+Compare the size and load time of the original chat.json format (history as a
+JSON string inside the chat JSON) with the compact storage format, plain and
+compressed.
+
+Run from the repository root:
+    python -m bench.chat_storage
+"""
+
+import io
+import json
+import random
+import time
+
+from python.helpers import chat_storage
+
+
+def make_message(i: int, ai: bool) -> dict:
+    if ai:
+        content = {
+            "thoughts": [f"step {i}: checking the output", "then I will continue"],
+            "tool_name": "code_execution_tool",
+            "tool_args": {
+                "runtime": "python",
+                "code": "\n".join(f"print({j} * {i})" for j in range(20)),
+            },
+        }
+    else:
+        content = {
+            "tool_name": "code_execution_tool",
+            "tool_result": "\n".join(
+                f"{j}: {random.random():.6f} ✓" for j in range(60)
+            ),
+        }
+    return {"_cls": "Message", "ai": ai, "content": content, "summary": ""}
+
+
+def make_chat(messages: int) -> dict:
+    # a chat in the current format, one agent with a long current topic
+    history = {
+        "_cls": "History",
+        "bulks": [],
+        "topics": [],
+        "current": {
+            "_cls": "Topic",
+            "summary": "",
+            "messages": [make_message(i, i % 2 == 1) for i in range(messages)],
+        },
+    }
+    logs = [
+        {
+            "no": i,
+            "id": None,
+            "type": "code_exe",
+            "heading": f"Agent 0: Using tool 'code_execution_tool' {i}",
+            "content": "\n".join(f"line {j} of output" for j in range(40)),
+            "temp": False,
+            "kvps": {"runtime": "python", "code": f"print({i})"},
+        }
+        for i in range(min(messages, 1000))
+    ]
+    return {
+        "id": "bench",
+        "name": "bench",
+        "version": chat_storage.FORMAT_VERSION,
+        "agents": [
+            {
+                "number": 0,
+                "name": "Agent 0",
+                "superior": -1,
+                "fanout": False,
+                "data": {},
+                "history": history,
+            }
+        ],
+        "streaming_agent": 0,
+        "streaming_agent_index": 0,
+        "log": {"guid": "bench", "offset": 0, "logs": logs},
+    }
+
+
+def encode_v1(data: dict) -> bytes:
+    old = dict(data, agents=[dict(a, history=json.dumps(a["history"])) for a in data["agents"]])
+    del old["version"]
+    return json.dumps(old, ensure_ascii=False).encode("utf-8")
+
+
+def load_v1(raw: bytes) -> dict:
+    data = json.loads(raw.decode("utf-8"))
+    for agent in data["agents"]:
+        agent["history"] = json.loads(agent["history"])
+    return data
+
+
+def encode_v2(data: dict, compression: str) -> bytes:
+    # as written by persist_chat
+    return chat_storage.compress(chat_storage.dumps(data).encode("utf-8"), compression)
+
+
+def timed(func, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run():
+    random.seed(0)
+    formats = ["none", "gzip"] + (["zstd"] if chat_storage.zstandard else [])
+    print(f"{'messages':>8} {'format':>10} {'size KB':>10} {'save ms':>9} {'load ms':>9}")
+    for messages in (100, 1000, 5000):
+        data = make_chat(messages)
+
+        raw, save_time = timed(encode_v1, data)
+        loaded, load_time = timed(load_v1, raw)
+        assert loaded["agents"][0]["history"] == data["agents"][0]["history"]
+        print(f"{messages:>8} {'v1 json':>10} {len(raw) / 1024:>10.0f} {save_time * 1000:>9.1f} {load_time * 1000:>9.1f}")
+
+        for compression in formats:
+            raw, save_time = timed(encode_v2, data, compression)
+            loaded, load_time = timed(lambda: chat_storage.load(io.BytesIO(raw)))
+            assert loaded == data
+            print(f"{messages:>8} {'v2 ' + compression:>10} {len(raw) / 1024:>10.0f} {save_time * 1000:>9.1f} {load_time * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,75 @@
+"""
+Compare re-parsing the whole accumulated response on every streamed chunk
+(DirtyJson.parse_string) with the resumable parser (DirtyJson.feed).
+
+Run from the repository root:
+    python bench/dirty_json_stream.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.dirty_json import DirtyJson  # noqa: E402
+
+
+def make_response(lines: int) -> str:
+    code = "\n".join(f"print('line {i}: ' + str({i} * 2))" for i in range(lines))
+    return json.dumps(
+        {
+            "thoughts": ["I need to run a long script", "then check the output"],
+            "tool_name": "code_execution_tool",
+            "tool_args": {"runtime": "python", "code": code},
+        },
+        indent=4,
+    )
+
+
+def make_chunks(text: str, size: int = 4) -> list[str]:
+    # roughly one token per chunk
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def bench_full(chunks: list[str]):
+    full = ""
+    result = None
+    for chunk in chunks:
+        full += chunk
+        result = DirtyJson.parse_string(full)
+    return result
+
+
+def bench_feed(chunks: list[str]):
+    parser = DirtyJson()
+    result = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        result = parser.snapshot()  # as the agent logs every chunk
+    return result
+
+
+def run():
+    print(f"{'chars':>8} {'chunks':>8} {'parse_string':>14} {'feed':>10} {'speedup':>8}")
+    for lines in (10, 50, 200, 500):
+        text = make_response(lines)
+        chunks = make_chunks(text)
+
+        start = time.perf_counter()
+        expected = bench_full(chunks)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = bench_feed(chunks)
+        feed_time = time.perf_counter() - start
+
+        assert result == expected, "parsers disagree"
+        print(
+            f"{len(text):>8} {len(chunks):>8} {full_time:>13.3f}s {feed_time:>9.3f}s {full_time / feed_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run()
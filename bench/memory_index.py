@@ -0,0 +1,61 @@
+"""
+Recall and latency of the memory index types against the flat baseline, on
+synthetic clustered embeddings.
+
+Run from the repository root:
+    python -m bench.memory_index [documents] [dimensions]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from python.helpers import memory_index
+
+K = 10
+QUERIES = 200
+
+
+def make_vectors(count: int, dimensions: int, clusters: int = 200) -> np.ndarray:
+    # embeddings are not uniform, documents group around topics
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)]
+    vectors += rng.normal(scale=0.6, size=vectors.shape).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(count: int = 100000, dimensions: int = 384):
+    data = make_vectors(count + QUERIES, dimensions)
+    vectors, queries = data[:count], data[count:]
+
+    print(f"{count} documents, {dimensions} dimensions, recall@{K} over {QUERIES} queries")
+    print(f"{'type':>8} {'build s':>9} {'query ms':>9} {'recall':>7} {'MB':>8}")
+    truth = None
+    for type in ("flat", "hnsw", "ivf", "ivfsq8", "ivfpq"):
+        start = time.perf_counter()
+        index = memory_index.build(type, vectors)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = np.vstack([index.search(q[None, :], K)[1] for q in queries])
+        query_time = (time.perf_counter() - start) / QUERIES
+        if truth is None:
+            truth = found
+
+        size = len(memory_index.faiss.serialize_index(index)) / 1024 / 1024
+        print(
+            f"{type:>8} {build_time:>9.2f} {query_time * 1000:>9.3f} "
+            f"{recall(found, truth):>7.3f} {size:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    run(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,56 @@
+"""
+Index size and recall of the quantized memory storage types, with and without
+re-ranking by exact vectors read from a memory mapped file.
+
+Run from the repository root:
+    python -m bench.memory_storage [documents] [dimensions]
+"""
+
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench.memory_index import K, QUERIES, make_vectors, recall
+from python.helpers import memory_index
+from python.helpers.memory_vectors import VectorFile, get_rerank_factor
+
+
+def run(count: int = 100000, dimensions: int = 384):
+    data = make_vectors(count + QUERIES, dimensions)
+    vectors, queries = data[:count], data[count:]
+    truth = memory_index.build("flat", vectors).search(queries, K)[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = VectorFile(tmp, dimensions)
+        ids = [str(i) for i in range(count)]
+        file.append(ids, vectors)
+        fetch = K * get_rerank_factor()
+
+        print(f"{count} documents, {dimensions} dimensions, recall@{K} over {QUERIES} queries")
+        print(f"{'type':>6} {'MB':>8} {'recall':>7} {'reranked':>9} {'query ms':>9}")
+        for type in ("flat", "fp16", "sq8", "pq"):
+            index = memory_index.build(type, vectors)
+            size = len(memory_index.faiss.serialize_index(index)) / 1024 / 1024
+            found = index.search(queries, K)[1]
+
+            start = time.perf_counter()
+            reranked = []
+            for query in queries:
+                candidates = index.search(query[None, :], fetch)[1][0]
+                candidates = [ids[c] for c in candidates if c >= 0]
+                scores = file.scores(candidates, query.tolist())
+                order = np.argsort(scores)[::-1][:K]
+                reranked.append([int(candidates[o]) for o in order])
+            query_time = (time.perf_counter() - start) / QUERIES
+
+            print(
+                f"{type:>6} {size:>8.1f} {recall(found, truth):>7.3f} "
+                f"{recall(np.array(reranked), truth):>9.3f} {query_time * 1000:>9.3f}"
+            )
+        print(f"exact vectors file {count * dimensions * 4 / 1024 / 1024:.1f} MB on disk")
+
+
+if __name__ == "__main__":
+    run(*(int(a) for a in sys.argv[1:3]))
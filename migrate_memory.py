@@ -0,0 +1,115 @@
+"""
+Rebuild memory folders as another index type, and write or drop the exact vectors
+used to re-rank results of quantized indexes.
+
+Run from the repository root while the framework is not running:
+    python migrate_memory.py default --type sq8 --rerank
+    python migrate_memory.py all --type flat --no-rerank
+"""
+
+import argparse
+import os
+
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from python.helpers import files, memory_index, memory_vectors
+from python.helpers.memory import Memory, MyFaiss
+from python.helpers.memory_vectors import VectorFile
+from python.helpers.memory_wal import INDEX_FILES, VECTOR_FILES, MemoryWal
+from python.helpers.print_style import PrintStyle
+
+
+def migrate(subdir: str, type: str | None, rerank: bool | None):
+    db_dir = files.get_abs_path("memory", subdir)
+    wal = MemoryWal.get(db_dir)
+    wal.recover_files()
+    if not files.exists(db_dir, INDEX_FILES[0]):
+        PrintStyle.error(f"No memory index in {db_dir}")
+        return
+    size_before = _size(db_dir)
+
+    db = MyFaiss.load_folder(
+        db_dir,
+        None,  # type: ignore
+        distance_strategy=DistanceStrategy.COSINE,
+        relevance_score_fn=Memory._cosine_normalizer,
+    )
+    if os.path.exists(os.path.join(db_dir, VECTOR_FILES[1])):
+        db.vector_file = VectorFile(db_dir, db.index.d)
+    wal.attach(db)
+
+    # exact vectors when they are all stored, otherwise the ones kept by the index
+    ids = [db.index_to_docstore_id[p] for p in range(db.index.ntotal)]
+    source = memory_index.get_index_type(db.index)
+    vector_file = db.vector_file
+    if vector_file and ids and all(id in vector_file.rows for id in ids):
+        vectors = vector_file.get(ids)
+    else:
+        vectors = memory_index.get_vectors(db.index)
+        if source in memory_index.LOSSY_TYPES and len(ids):
+            PrintStyle.hint(
+                f"{subdir}: index is {source}, vectors are rebuilt from its approximations"
+            )
+
+    config = memory_index.read_config(db_dir)
+    if type:
+        config["type"] = type
+    if rerank is not None:
+        config["rerank"] = rerank
+    memory_index.write_config(db_dir, config)
+
+    target = memory_index.get_target_type(memory_index.get_configured_type(db_dir), len(ids))
+    with wal.lock:
+        db.index = memory_index.build(target, vectors)
+        db.area_positions = None
+        if memory_vectors.is_enabled(db_dir):
+            db.vector_file = vector_file or VectorFile(db_dir, vectors.shape[1])
+            db.vector_file.rewrite(ids, vectors)
+        else:
+            db.vector_file = None
+        wal.mark_dirty()
+    wal.checkpoint()
+
+    if not db.vector_file:
+        for name in VECTOR_FILES:
+            if os.path.exists(os.path.join(db_dir, name)):
+                os.remove(os.path.join(db_dir, name))
+
+    PrintStyle.standard(
+        f"{subdir}: {len(ids)} documents, {source} -> {target}"
+        f"{' with re-ranking' if db.vector_file else ''}, "
+        f"{size_before / 1024 / 1024:.1f} MB -> {_size(db_dir) / 1024 / 1024:.1f} MB"
+    )
+
+
+def _size(db_dir: str) -> int:
+    # index and exact vectors, the documents are not changed
+    names = (INDEX_FILES[0],) + VECTOR_FILES
+    return sum(
+        os.path.getsize(os.path.join(db_dir, n))
+        for n in names
+        if os.path.exists(os.path.join(db_dir, n))
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate memory index storage")
+    parser.add_argument("subdir", help="memory subfolder, or 'all'")
+    parser.add_argument("--type", choices=memory_index.TYPES, help="index type")
+    parser.add_argument(
+        "--rerank",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="store exact vectors to re-rank quantized results",
+    )
+    args = parser.parse_args()
+
+    if args.subdir == "all":
+        root = files.get_abs_path("memory")
+        subdirs = sorted(
+            d for d in os.listdir(root) if files.exists(root, d, INDEX_FILES[0])
+        )
+    else:
+        subdirs = [args.subdir]
+    for subdir in subdirs:
+        migrate(subdir, args.type, args.rerank)
@@ -1,5 +1,9 @@
+import asyncio
 from enum import Enum
+import json
 import os
+import threading
+import weakref
 from typing import Any
 from langchain_openai import (
     ChatOpenAI,
@@ -26,6 +30,7 @@ from langchain_google_genai import (
     embeddings as google_embeddings,
 )
 from langchain_mistralai import ChatMistralAI
+from langchain_core.messages import BaseMessage
 
 # from pydantic.v1.types import SecretStr
 from python.helpers import dotenv, runtime
@@ -59,6 +64,14 @@ class ModelProvider(Enum):
 
 rate_limiters: dict[str, RateLimiter] = {}
 
+# model client instances shared by all contexts, per event loop and keyed by type, provider, name
+# and kwargs, the clients of a loop are dropped together with the loop
+model_cache: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_model_cache_no_loop: dict[str, Any] = {}  # models created outside of a running loop
+_model_cache_lock = threading.Lock()
+
 
 # Utility function to get API keys from environment variables
 def get_api_key(service):
@@ -70,11 +83,50 @@ def get_api_key(service):
 
 
 def get_model(type: ModelType, provider: ModelProvider, name: str, **kwargs):
+    # reuse the client instance (and with it the HTTP connection pool) for the same config
+    key = _get_model_cache_key(type, provider, name, kwargs)
+    with _model_cache_lock:
+        cache = _get_loop_model_cache()
+        model = cache.get(key)
+        if model is None:
+            model = cache[key] = create_model(type, provider, name, **kwargs)
+    return model
+
+
+def create_model(type: ModelType, provider: ModelProvider, name: str, **kwargs):
     fnc_name = f"get_{provider.name.lower()}_{type.name.lower()}"  # function name of model getter
     model = globals()[fnc_name](name, **kwargs)  # call function by name
     return model
 
 
+def clear_model_cache():
+    with _model_cache_lock:
+        model_cache.clear()
+        _model_cache_no_loop.clear()
+
+
+def _get_loop_model_cache() -> dict[str, Any]:
+    # async HTTP clients are bound to the event loop they were first used on
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _model_cache_no_loop
+    cache = model_cache.get(loop)
+    if cache is None:
+        # clients can keep their loop referenced, drop the closed ones explicitly
+        for other in [l for l in model_cache.keys() if l.is_closed()]:
+            model_cache.pop(other, None)
+        cache = model_cache[loop] = {}
+    return cache
+
+
+def _get_model_cache_key(
+    type: ModelType, provider: ModelProvider, name: str, kwargs: dict
+) -> str:
+    args = json.dumps(kwargs, sort_keys=True, default=str)
+    return f"{type.name}\\{provider.name}\\{name}\\{args}"
+
+
 def get_rate_limiter(
     provider: ModelProvider, name: str, requests: int, input: int, output: int
 ) -> RateLimiter:
@@ -88,6 +140,51 @@ def get_rate_limiter(
     return limiter
 
 
+# providers that need explicit prompt cache breakpoints, others cache stable prefixes automatically
+CACHE_BREAKPOINT_PROVIDERS = [ModelProvider.ANTHROPIC]
+
+
+def add_cache_breakpoints(
+    provider: ModelProvider, messages: list[BaseMessage], indexes: list[int]
+) -> list[BaseMessage]:
+    if provider not in CACHE_BREAKPOINT_PROVIDERS:
+        return messages
+    result = list(messages)
+    for i in indexes:
+        msg = result[i]
+        if not isinstance(msg.content, str) or not msg.content:
+            continue
+        # everything up to and including this message can be served from cache
+        result[i] = msg.__class__(
+            content=[
+                {
+                    "type": "text",
+                    "text": msg.content,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+        )
+    return result
+
+
+def parse_usage(chunk: Any, usage: dict[str, int] | None = None) -> dict[str, int]:
+    # collect token usage incl. prompt cache hits from streamed chunks
+    usage = usage if usage is not None else {}
+    metadata = getattr(chunk, "usage_metadata", None)
+    if metadata:
+        details = metadata.get("input_token_details") or {}
+        for key, value in (
+            ("input", metadata.get("input_tokens")),
+            ("output", metadata.get("output_tokens")),
+            ("cache_read", details.get("cache_read")),
+            ("cache_creation", details.get("cache_creation")),
+        ):
+            if value:
+                # providers report running totals, keep the highest
+                usage[key] = max(usage.get(key, 0), value)
+    return usage
+
+
 def parse_chunk(chunk: Any):
     if isinstance(chunk, str):
         content = chunk
@@ -224,6 +321,7 @@ def get_openai_chat(
 ):
     if not api_key:
         api_key = get_api_key("openai")
+    kwargs.setdefault("stream_usage", True)  # report usage incl. cached prompt tokens
     return ChatOpenAI(model_name=model_name, api_key=api_key, **kwargs)  # type: ignore
 
 
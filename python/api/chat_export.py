@@ -9,9 +9,20 @@ class ExportChat(ApiHandler):
             raise Exception("No context id provided")
 
         context = self.get_context(ctxid)
+
+        # stream the chat file directly, without building the whole export in memory
+        if input.get("stream", False):
+            return Response(
+                persist_chat.export_json_chat_stream(context),
+                mimetype="application/json",
+                headers={
+                    "Content-Disposition": f'attachment; filename="{context.id}.json"'
+                },
+            )
+
         content = persist_chat.export_json_chat(context)
         return {
             "message": "Chats exported.",
             "ctxid": context.id,
             "content": content,
-        }
\ No newline at end of file
+        }
@@ -5,11 +5,15 @@ from python.helpers import persist_chat
 
 class LoadChats(ApiHandler):
     async def process(self, input: Input, request: Request) -> Output:
-        chats = input.get("chats", [])
-        if not chats:
-            raise Exception("No chats provided")
-
-        ctxids = persist_chat.load_json_chats(chats)
+        # chat files uploaded as multipart form, plain or compressed
+        if "chats" in request.files:
+            streams = [file.stream for file in request.files.getlist("chats")]
+            ctxids = persist_chat.load_chat_files(streams)
+        else:
+            chats = input.get("chats", [])
+            if not chats:
+                raise Exception("No chats provided")
+            ctxids = persist_chat.load_json_chats(chats)
 
         return {
             "message": "Chats loaded.",
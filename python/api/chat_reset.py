@@ -11,7 +11,7 @@ class Reset(ApiHandler):
         # context instance - get or create
         context = self.get_context(ctxid)
         context.reset()
-        persist_chat.save_tmp_chat(context)
+        persist_chat.request_save(context)
 
         return {
             "message": "Agent restarted.",
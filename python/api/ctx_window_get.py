@@ -8,7 +8,7 @@ class GetCtxWindow(ApiHandler):
         ctxid = input.get("context", [])
         context = self.get_context(ctxid)
         agent = context.streaming_agent or context.agent0
-        window = agent.get_data(agent.DATA_NAME_CTX_WINDOW)
-        size = tokens.approximate_tokens(window)
+        window = agent.get_data(agent.DATA_NAME_CTX_WINDOW) or ""
+        size = tokens.approximate_tokens(window, agent.config.chat_model.name)
 
         return {"content": window, "tokens": size}
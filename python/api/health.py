@@ -3,6 +3,7 @@ from flask import Request, Response
 from python.helpers import errors
 
 from python.helpers import git
+from python.helpers.scheduler import Scheduler
 
 class HealthCheck(ApiHandler):
 
@@ -14,4 +15,4 @@ class HealthCheck(ApiHandler):
         except Exception as e:
             error = errors.error_text(e)
 
-        return {"gitinfo": gitinfo, "error": error}
+        return {"gitinfo": gitinfo, "error": error, "loops": Scheduler.get().stats()}
@@ -9,7 +9,9 @@ class GetHistory(ApiHandler):
         context = self.get_context(ctxid)
         agent = context.streaming_agent or context.agent0
         history = agent.history.output()
-        size = tokens.approximate_tokens(agent.history.output_text())
+        size = tokens.approximate_tokens(
+            agent.history.output_text(), agent.config.chat_model.name
+        )
 
         return {
             "history": history,
@@ -0,0 +1,81 @@
+import json
+import time
+
+from python.helpers.api import ApiHandler
+from flask import Request, Response
+
+from agent import AgentContext
+from python.helpers import change_signal
+
+KEEPALIVE = 15  # seconds between comments keeping idle connections open
+BATCH_INTERVAL = 0.025  # changes within this window are sent as one event
+MAX_AGE = 600  # seconds, the client reconnects and resumes from the last event id
+
+
+class LogStream(ApiHandler):
+    # server-sent events with the same data as /poll, sent only when something changed
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        ctxid = request.args.get("context", "")
+        log_guid = request.args.get("log_guid", "")
+        try:
+            log_from = int(request.args.get("log_from", 0))
+        except ValueError:
+            log_from = 0
+
+        # reconnect, resume from the last event the client received
+        last_event = request.headers.get("Last-Event-ID", "")
+        if ":" in last_event:
+            log_guid, version = last_event.rsplit(":", 1)
+            log_from = int(version) if version.isdigit() else 0
+
+        context = self.get_context(ctxid)
+        events = self.stream(context.id, log_guid, log_from)
+        return Response(
+            events,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def stream(self, ctxid: str, log_guid: str, log_from: int):
+        started = time.time()
+        signal = -1
+        sent: dict = {}
+        contexts = None
+        yield "retry: 1000\n\n"
+        while time.time() - started < MAX_AGE:
+            version = change_signal.wait(signal, KEEPALIVE)
+            if version == signal:
+                yield ": keepalive\n\n"
+                continue
+            signal = version
+
+            # hibernated or removed contexts have nothing new to send
+            context = AgentContext._contexts.get(ctxid)
+            if not context:
+                continue
+
+            log = context.log
+            state = {
+                "context": context.id,
+                "log_guid": log.guid,
+                "log_version": log.version,
+                "log_progress": log.progress,
+                "log_progress_active": log.progress_active,
+                "paused": context.paused,
+            }
+            metadata = AgentContext.all_metadata()
+            listed = [(m["id"], m["no"], m["name"], m["paused"]) for m in metadata]
+            if state == sent and listed == contexts:
+                continue
+
+            logs, state["log_version"] = log.output_for(log_from, log_guid, delta=True)
+            data = dict(state, logs=logs)
+            if listed != contexts:
+                data["contexts"] = metadata
+                contexts = listed
+            sent = state
+            log_guid, log_from = state["log_guid"], state["log_version"]
+
+            event_id = f"{log_guid}:{log_from}"
+            yield f"id: {event_id}\nevent: update\ndata: {json.dumps(data)}\n\n"
+            time.sleep(BATCH_INTERVAL)
@@ -0,0 +1,14 @@
+from python.helpers.api import ApiHandler
+from flask import Request, Response
+
+from python.helpers.loop_watchdog import LoopWatchdog, is_enabled
+from python.helpers.scheduler import Scheduler
+
+
+class LoopStats(ApiHandler):
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        return {
+            "loops": Scheduler.get().stats(),
+            "watchdog_enabled": is_enabled(),
+            "watchdogs": LoopWatchdog.get_stats(),
+        }
@@ -7,25 +7,16 @@ class Poll(ApiHandler):
     async def process(self, input: dict, request: Request) -> dict | Response:
         ctxid = input.get("context", None)
         from_no = input.get("log_from", 0)
+        log_guid = input.get("log_guid", None)
+        delta = input.get("log_delta", False)
 
         # context instance - get or create
         context = self.get_context(ctxid)
 
-        logs = context.log.output(start=from_no)
+        logs, log_version = context.log.output_for(start=from_no, guid=log_guid, delta=delta)
 
-        # loop AgentContext._contexts
-        ctxs = []
-        for ctx in AgentContext._contexts.values():
-            ctxs.append(
-                {
-                    "id": ctx.id,
-                    "no": ctx.no,
-                    "log_guid": ctx.log.guid,
-                    "log_version": len(ctx.log.updates),
-                    "log_length": len(ctx.log.logs),
-                    "paused": ctx.paused,
-                }
-            )
+        # all contexts, including hibernated ones
+        ctxs = AgentContext.all_metadata()
 
         # data from this server
         return {
@@ -33,8 +24,8 @@ class Poll(ApiHandler):
             "contexts": ctxs,
             "logs": logs,
             "log_guid": context.log.guid,
-            "log_version": len(context.log.updates),
+            "log_version": log_version,
             "log_progress": context.log.progress,
             "log_progress_active": context.log.progress_active,
             "paused": context.paused,
-        }
\ No newline at end of file
+        }
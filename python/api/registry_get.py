@@ -0,0 +1,9 @@
+from python.helpers.api import ApiHandler
+from flask import Request, Response
+
+from python.helpers import extract_tools
+
+
+class GetRegistry(ApiHandler):
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        return {"registry": extract_tools.get_registry()}
@@ -5,4 +5,4 @@ from python.helpers import persist_chat
 
 class SaveChat(Extension):
     async def execute(self, loop_data: LoopData = LoopData(), **kwargs):
-        persist_chat.save_tmp_chat(self.agent.context)
\ No newline at end of file
+        persist_chat.request_save(self.agent.context)
\ No newline at end of file
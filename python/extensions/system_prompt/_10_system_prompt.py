@@ -1,4 +1,3 @@
-from datetime import datetime
 from python.helpers.extension import Extension
 from agent import Agent, LoopData
 
@@ -20,10 +19,8 @@ def get_tools_prompt(agent: Agent):
 
 def get_prompt(file: str, agent: Agent):
     # variables for system prompts
-    # TODO: move variables to the end of chain
-    # variables in system prompt would break prompt caching, better to add them to the last message in conversation
+    # only stable values here, anything changing between calls would break prompt caching
     vars = {
-        "date_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "agent_name": agent.agent_name,
     }
-    return agent.read_prompt(file, **vars)
\ No newline at end of file
+    return agent.read_prompt(file, **vars)
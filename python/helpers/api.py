@@ -29,6 +29,8 @@ class ApiHandler:
             # input data from request based on type
             if request.is_json:
                 input = request.get_json()
+            elif request.mimetype == "multipart/form-data":
+                input = request.form.to_dict()  # files are read by the handler
             else:
                 input = {"data": request.get_data(as_text=True)}
 
@@ -0,0 +1,20 @@
+import threading
+
+# process wide signal for changes the web UI shows, log items, progress and the list of chats
+
+_condition = threading.Condition()
+_version = 0
+
+
+def notify():
+    global _version
+    with _condition:
+        _version += 1
+        _condition.notify_all()
+
+
+def wait(version: int, timeout: float | None = None) -> int:
+    # block until anything changed after the given version, returns the current version
+    with _condition:
+        _condition.wait_for(lambda: _version != version, timeout)
+        return _version
@@ -0,0 +1,101 @@
+import gzip
+import io
+import json
+from typing import Any, IO, Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # optional, gzip is used instead
+
+FORMAT_VERSION = 2  # 1: history as JSON string inside the chat JSON, 2: history as object
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def get_compression(name: str) -> str:
+    name = (name or "none").lower()
+    if name not in EXTENSIONS:
+        return "none"
+    if name == "zstd" and zstandard is None:
+        return "gzip"
+    return name
+
+
+def json_default(o: Any):
+    # values that can not be serialized are stored as null
+    return None
+
+
+def dumps(data: Any) -> str:
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"), default=json_default
+    )
+
+
+def iter_encode(data: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # encode in pieces of about chunk_size characters, the whole document is never built
+    encoder = json.JSONEncoder(
+        ensure_ascii=False, separators=(",", ":"), default=json_default
+    )
+    buffer: list[str] = []
+    size = 0
+    for part in encoder.iterencode(data):
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def compress(raw: bytes, compression: str) -> bytes:
+    compression = get_compression(compression)
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)  # type: ignore
+    return raw
+
+
+def open_stream(stream: IO[bytes]) -> IO[bytes]:
+    # transparently decompress gzip and zstd streams, detected by their magic bytes
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)  # type: ignore
+    head = stream.peek(4)[:4]  # type: ignore
+    if head.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=stream)  # type: ignore
+    if head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception("zstandard package is required to read zstd compressed chats")
+        return zstandard.ZstdDecompressor().stream_reader(stream)  # type: ignore
+    return stream
+
+
+def load(stream: IO[bytes]) -> dict[str, Any]:
+    # decompressed while read, but the json module parses the whole document at once,
+    # only saving and exporting are streamed
+    return json.load(io.TextIOWrapper(open_stream(stream), encoding="utf-8"))
+
+
+def read_file(path: str) -> dict[str, Any]:
+    with open(path, "rb") as f:
+        return load(f)
+
+
+def upgrade(data: dict[str, Any]) -> bool:
+    # convert chat data to the current format, returns True if anything changed
+    version = data.get("version", 1)
+    if version >= FORMAT_VERSION:
+        return False
+    for agent in data.get("agents", []):
+        history = agent.get("history")
+        if isinstance(history, str):
+            agent["history"] = json.loads(history) if history else None
+    data["version"] = FORMAT_VERSION
+    return True
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable
+
+from python.helpers import dotenv
+
+
+def get_window() -> float:
+    # seconds, 0 passes every update through
+    try:
+        return max(0.0, float(dotenv.get_dotenv_value("STREAM_COALESCE_MS", 50)) / 1000)
+    except (TypeError, ValueError):
+        return 0.05
+
+
+class Coalescer:
+    # batches high frequency calls to a sink, at most one call per window plus a trailing one
+    def __init__(self, sink: Callable[..., Any], window: float | None = None):
+        self.sink = sink
+        self.window = get_window() if window is None else window
+        self.pending: dict[str, Any] = {}
+        self.last_flush = 0.0
+        self.scheduled = False
+        self.lock = threading.RLock()
+
+    def push(self, **kwargs):
+        # the latest value of each argument wins
+        with self.lock:
+            self.pending.update(kwargs)
+            self._flush_or_schedule()
+
+    def append(self, **kwargs):
+        # string arguments are concatenated with the pending ones
+        with self.lock:
+            for key, value in kwargs.items():
+                self.pending[key] = self.pending.get(key, "") + value
+            self._flush_or_schedule()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+            self.sink(**pending)
+
+    def _flush_or_schedule(self):
+        delay = self.last_flush + self.window - time.monotonic()
+        if delay <= 0:
+            self.flush()
+        elif not self.scheduled:
+            self.scheduled = True
+            try:
+                # trailing flush on the caller's event loop when there is one
+                asyncio.get_running_loop().call_later(delay, self._on_timer)
+            except RuntimeError:
+                timer = threading.Timer(delay, self._on_timer)
+                timer.daemon = True
+                timer.start()
+
+    def _on_timer(self):
+        with self.lock:
+            self.scheduled = False
+            self.flush()
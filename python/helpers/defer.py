@@ -3,6 +3,7 @@ from dataclasses import dataclass
 import threading
 from concurrent.futures import Future
 from typing import Any, Callable, Optional, Coroutine, TypeVar, Awaitable
+from python.helpers.loop_watchdog import LoopWatchdog
 
 T = TypeVar("T")
 
@@ -30,6 +31,7 @@ class EventLoopThread:
                 target=self._run_event_loop, daemon=True, name=self.thread_name
             )
             self.thread.start()
+        LoopWatchdog.attach(self)
 
     def _run_event_loop(self):
         if not self.loop:
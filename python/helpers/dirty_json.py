@@ -8,6 +8,17 @@ class DirtyJson:
         self.current_char = None
         self.result = None
         self.stack = []
+        # state of the resumable parser used by feed()
+        self.consumed = 0  # total number of characters fed so far
+        self._state = "start"
+        self._resume = ""  # state to return to after a comment
+        self._keys = []  # pending key for every open container in self.stack
+        self._token = []  # slices of the key/value currently being read
+        self._token_changed = False  # slices added since the partial value was last exposed
+        self._token_kind = ""
+        self._quote = ""
+        self._partial = False  # partial value appended to the innermost list
+        self._done = False
 
     @staticmethod
     def parse_string(json_string):
@@ -19,15 +30,363 @@ class DirtyJson:
         self.json_string = json_string
         self.index = self.get_start_pos(self.json_string) #skip any text up to the first brace
         self.current_char = self.json_string[self.index]
-        self._parse()
+        self.result = self._parse_value()
         return self.result
         
     def feed(self, chunk):
-        self.json_string += chunk
-        if not self.current_char and self.json_string:
-            self.current_char = self.json_string[0]
-        self._parse()
-        return self.result
+        """Continue parsing with the next chunk of a streamed string.
+        Only the new characters are scanned, snapshot() returns the result so far."""
+        self.consumed += len(chunk)
+        # keep only the unconsumed lookahead, the rest has already been parsed
+        self.json_string = self.json_string[self.index:] + chunk
+        self.index = 0
+        while not self._done and self.index < len(self.json_string):
+            if not self._feed_step():
+                break  # more input needed
+
+    def snapshot(self):
+        """Return a copy of the result so far that later feed() calls do not change.
+        Unfinished strings and numbers are included as partial values, only the containers
+        still open are copied, closed ones are not modified anymore."""
+        if not self._done:
+            self._feed_partial()
+        copies = {}
+        for container in reversed(self.stack):
+            if isinstance(container, dict):
+                copy = {k: copies.get(id(v), v) for k, v in container.items()}
+            else:
+                copy = [copies.get(id(v), v) for v in container]
+            copies[id(container)] = copy
+        return copies.get(id(self.result), self.result)
+
+    def _feed_step(self) -> bool:
+        s = self.json_string
+        i = self.index
+        c = s[i]
+        state = self._state
+
+        if state == "start":
+            # skip any text up to the first brace
+            indices = [pos for pos in (s.find(ch, i) for ch in "{[\"") if pos != -1]
+            if not indices:
+                self.index = len(s)
+                return False
+            self.index = min(indices)
+            self._state = "value"
+            return True
+
+        if state == "line_comment":
+            end = s.find("\n", i)
+            if end == -1:
+                self.index = len(s)
+                return False
+            self.index = end + 1
+            self._state = self._resume
+            return True
+
+        if state == "block_comment":
+            end = s.find("*/", i)
+            if end == -1:
+                self.index = max(i, len(s) - 1)  # keep a trailing '*'
+                return False
+            self.index = end + 2
+            self._state = self._resume
+            return True
+
+        if state in ("string", "multiline", "number", "unquoted", "unquoted_key"):
+            return getattr(self, "_feed_" + state)()
+
+        # whitespace and comments between tokens
+        if c.isspace():
+            self.index += 1
+            return True
+        if c == "/":
+            if i + 1 >= len(s):
+                return False
+            if s[i + 1] in "/*":
+                self._resume = state
+                self._state = "line_comment" if s[i + 1] == "/" else "block_comment"
+                self.index += 2
+                return True
+
+        if state == "value":
+            return self._feed_value()
+        if state == "key":
+            return self._feed_key()
+        if state == "colon":
+            if c == ":":
+                self.index += 1
+            self._state = "value"
+            return True
+        if state == "after":
+            return self._feed_after()
+        return False
+
+    def _feed_value(self) -> bool:
+        s = self.json_string
+        i = self.index
+        c = s[i]
+        top = self.stack[-1] if self.stack else None
+
+        if c == "{":
+            if i + 1 >= len(s):
+                return False
+            # {{ opens one object, only around the whole document so nested braces stay balanced
+            self.index += 2 if s[i + 1] == "{" and not self.stack else 1
+            self._feed_open({})
+        elif c == "[":
+            self.index += 1
+            self._feed_open([])
+        elif c in ['"', "'", "`"]:
+            if i + 2 >= len(s):
+                return False
+            if s[i + 1 : i + 3] == c * 2:
+                self.index += 3
+                self._feed_token("multiline", c)
+            else:
+                self.index += 1
+                self._feed_token("string", c)
+        elif c.isdigit() or c in ["-", "+"]:
+            self._feed_token("number")
+        elif c in ["}", "]"] and top is not None:
+            if isinstance(top, dict):
+                self._feed_store(None)  # missing value
+            else:
+                self._state = "after"
+        elif c == ",":
+            self._feed_store("")  # missing value
+        elif c == ":":
+            self.index += 1
+        else:
+            rest = s[i : i + 9].lower()
+            for literal, value in (("true", True), ("false", False), ("null", None), ("undefined", None)):
+                if rest.startswith(literal):
+                    self.index += len(literal)
+                    self._feed_store(value)
+                    return True
+                if literal.startswith(rest):
+                    return False  # could still become a literal
+            self._feed_token("unquoted")
+        return True
+
+    def _feed_key(self) -> bool:
+        s = self.json_string
+        i = self.index
+        c = s[i]
+        if c == "}":
+            if i + 1 >= len(s):
+                return False
+            self.index += 2 if s[i + 1] == "}" and len(self.stack) == 1 else 1  # Handle }}
+            self._feed_close()
+        elif c in [",", "]"]:
+            self.index += 1
+        elif c in ['"', "'"]:
+            self.index += 1
+            self._feed_token("string", c, key=True)
+        else:
+            self._feed_token("unquoted_key", key=True)
+        return True
+
+    def _feed_after(self) -> bool:
+        c = self.json_string[self.index]
+        if isinstance(self.stack[-1], dict):
+            if c == ",":
+                self.index += 1
+            self._state = "key"  # '}' is handled by key state
+        elif c == ",":
+            self.index += 1
+            self._state = "value"
+        else:
+            if c == "]":
+                self.index += 1
+            self._feed_close()
+        return True
+
+    def _feed_string(self) -> bool:
+        s = self.json_string
+        i = self.index
+        quote = s.find(self._quote, i)
+        escape = s.find("\\", i, quote if quote != -1 else len(s))
+        stop = escape if escape != -1 else quote
+        if stop == -1:
+            self._feed_append(s[i:])
+            self.index = len(s)
+            return False
+        self._feed_append(s[i:stop])
+        self.index = stop
+        if stop == quote:
+            self.index += 1  # Skip closing quote
+            self._feed_finish(self._feed_text())
+            return True
+        # escape sequence
+        if stop + 1 >= len(s):
+            return False
+        char = s[stop + 1]
+        if char in ['"', "'", "\\", "/", "b", "f", "n", "r", "t"]:
+            self._feed_append({"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}.get(char, char))
+            self.index += 2
+        elif char == "u":
+            digits = s[stop + 2 : stop + 6]
+            count = 0
+            while count < len(digits) and digits[count].isalnum():
+                count += 1
+            if count == len(digits) < 4:
+                return False  # wait for the rest of the digits
+            self.index += 2 + count
+            try:
+                if count < 4:
+                    raise ValueError()
+                self._feed_append(chr(int(digits, 16)))
+            except ValueError:
+                # If invalid hex value, treat as literal
+                self._feed_append("\\u" + digits[:count])
+        else:
+            self.index += 2
+        return True
+
+    def _feed_multiline(self) -> bool:
+        s = self.json_string
+        i = self.index
+        end = s.find(self._quote * 3, i)
+        if end == -1:
+            safe = max(i, len(s) - 2)  # keep a possibly unfinished closing quote
+            self._feed_append(s[i:safe])
+            self.index = safe
+            return False
+        self._feed_append(s[i:end])
+        self.index = end + 3
+        self._feed_finish(self._feed_text().strip())
+        return True
+
+    def _feed_number(self) -> bool:
+        s = self.json_string
+        end = self.index
+        while end < len(s) and (s[end].isdigit() or s[end] in ["-", "+", ".", "e", "E"]):
+            end += 1
+        self._feed_append(s[self.index : end])
+        self.index = end
+        if end >= len(s):
+            return False
+        self._feed_finish(self._feed_number_value(self._feed_text()))
+        return True
+
+    def _feed_number_value(self, number_str: str):
+        try:
+            return int(number_str)
+        except ValueError:
+            try:
+                return float(number_str)
+            except ValueError:
+                return None
+
+    def _feed_unquoted(self) -> bool:
+        s = self.json_string
+        end = self.index
+        while end < len(s) and s[end] not in [":", ",", "}", "]"]:
+            end += 1
+        self._feed_append(s[self.index : end])
+        self.index = end
+        if end >= len(s):
+            return False
+        if s[end] == ":":
+            self.index += 1
+        self._feed_finish(self._feed_text().strip())
+        return True
+
+    def _feed_unquoted_key(self) -> bool:
+        s = self.json_string
+        end = self.index
+        while end < len(s) and not s[end].isspace() and s[end] not in [":", ",", "}", "]"]:
+            end += 1
+        self._feed_append(s[self.index : end])
+        self.index = end
+        if end >= len(s):
+            return False
+        self._feed_finish(self._feed_text())
+        return True
+
+    def _feed_token(self, kind: str, quote: str = "", key: bool = False):
+        self._state = kind
+        self._token_kind = "key" if key else "value"
+        self._quote = quote
+        self._token = []
+        self._token_changed = True
+
+    def _feed_append(self, text: str):
+        if text:
+            self._token.append(text)
+            self._token_changed = True
+
+    def _feed_text(self) -> str:
+        # slices read since the last call are joined to the text kept from before
+        if len(self._token) != 1:
+            self._token = ["".join(self._token)]
+        return self._token[0]
+
+    def _feed_finish(self, value):
+        self._token = []
+        if self._token_kind == "key":
+            self._keys[-1] = value
+            self._state = "colon"
+        else:
+            self._feed_store(value)
+
+    def _feed_store(self, value):
+        if not self.stack:
+            self.result = value
+            self._done = True
+            return
+        top = self.stack[-1]
+        if isinstance(top, dict):
+            top[self._keys[-1]] = value
+            self._keys[-1] = None
+        elif self._partial:
+            top[-1] = value
+        else:
+            top.append(value)
+        self._partial = False
+        self._state = "after"
+
+    def _feed_open(self, container):
+        self._feed_store(container)
+        self._done = False
+        self.stack.append(container)
+        self._keys.append(None)
+        self._state = "key" if isinstance(container, dict) else "value"
+
+    def _feed_close(self):
+        self.stack.pop()
+        self._keys.pop()
+        if self.stack:
+            self._state = "after"
+        else:
+            self._done = True
+
+    def _feed_partial(self):
+        # expose the unfinished value, same as parse() does for truncated input
+        if self._state in ("string", "multiline", "number", "unquoted") and self._token_kind == "value":
+            if not self._token_changed:
+                return  # the exposed partial value is still current
+            self._token_changed = False
+            text = self._feed_text()
+            if self._state == "number":
+                value = self._feed_number_value(text)
+            elif self._state == "string":
+                value = text
+            else:
+                value = text.strip()
+            if not self.stack:
+                self.result = value
+            elif isinstance(self.stack[-1], dict):
+                self.stack[-1][self._keys[-1]] = value
+            elif self._partial:
+                self.stack[-1][-1] = value
+            else:
+                self.stack[-1].append(value)
+                self._partial = True
+        elif self._state in ("colon", "value") and self.stack and isinstance(self.stack[-1], dict):
+            if self._keys[-1] is not None:
+                self.stack[-1].setdefault(self._keys[-1], None)
 
     def _advance(self, count=1):
         self.index += count
@@ -61,28 +420,11 @@ class DirtyJson:
                 break
             self._advance()
 
-    def _parse(self):
-        if self.result is None:
-            self.result = self._parse_value()
-        else:
-            self._continue_parsing()
-
-    def _continue_parsing(self):
-        while self.current_char is not None:
-            if isinstance(self.result, dict):
-                self._parse_object_content()
-            elif isinstance(self.result, list):
-                self._parse_array_content()
-            elif isinstance(self.result, str):
-                self.result = self._parse_string()
-            else:
-                break
-
     def _parse_value(self):
         self._skip_whitespace()
         if self.current_char == '{':
-            if self._peek(1) == '{':  # Handle {{
-                self._advance(2)
+            if self._peek(1) == '{' and not self.stack:  # Handle {{ around the whole document
+                self._advance()
             return self._parse_object()
         elif self.current_char == '[':
             return self._parse_array()
@@ -120,7 +462,7 @@ class DirtyJson:
         while self.current_char is not None:
             self._skip_whitespace()
             if self.current_char == '}':
-                if self._peek(1) == '}':  # Handle }}
+                if self._peek(1) == '}' and len(self.stack) == 1:  # Handle }}
                     self._advance(2)
                 else:
                     self._advance()
@@ -1,4 +1,4 @@
-import re, os, importlib, inspect
+import re, os, importlib, inspect, threading
 from typing import Any, Type, TypeVar
 from .dirty_json import DirtyJson
 from .files import get_abs_path
@@ -77,4 +77,40 @@ def load_classes_from_folder(folder: str, name_pattern: str, base_class: Type[T]
                 if one_per_file:
                     break
 
-    return classes
\ No newline at end of file
+    return classes
+
+
+# process-wide registry of classes loaded from folders, keyed by folder, pattern and base class
+# entries are rebuilt whenever the folder's mtime changes (file added, removed or renamed)
+_registry: dict[tuple[str, str, type, bool], tuple[int, list[type]]] = {}
+_registry_lock = threading.Lock()
+
+def get_classes_from_folder(folder: str, name_pattern: str, base_class: Type[T], one_per_file: bool = True) -> list[Type[T]]:
+    key = (folder, name_pattern, base_class, one_per_file)
+    mtime = os.stat(get_abs_path(folder)).st_mtime_ns
+
+    cached = _registry.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]  # type: ignore
+
+    with _registry_lock:
+        cached = _registry.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]  # type: ignore
+        classes = load_classes_from_folder(folder, name_pattern, base_class, one_per_file)
+        _registry[key] = (mtime, classes)
+        return classes
+
+def get_registry() -> list[dict[str, Any]]:
+    with _registry_lock:
+        entries = list(_registry.items())
+    return [
+        {
+            "folder": folder,
+            "pattern": pattern,
+            "base_class": base_class.__name__,
+            "mtime": mtime,
+            "classes": [cls.__module__ + "." + cls.__name__ for cls in classes],
+        }
+        for (folder, pattern, base_class, _), (mtime, classes) in entries
+    ]
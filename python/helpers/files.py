@@ -45,6 +45,96 @@ def read_file(_relative_path, _backup_dirs=None, _encoding="utf-8", **kwargs):
     return content
 
 
+class Template:
+    # prompt file parsed once: includes expanded, code fences removed, placeholders split into slots
+    placeholder_pattern = re.compile(r"{{(\w+)}}")
+
+    def __init__(self, content: str, is_json: bool, dependencies: dict[str, int]):
+        self.is_json = is_json
+        self.dependencies = dependencies  # absolute paths of the file and its includes with mtimes
+        # literal text on even indexes, placeholder names on odd indexes
+        self.segments = Template.placeholder_pattern.split(content)
+
+    def is_current(self) -> bool:
+        try:
+            return all(
+                os.stat(path).st_mtime_ns == mtime
+                for path, mtime in self.dependencies.items()
+            )
+        except OSError:
+            return False
+
+    def render(self, _format=str, **kwargs) -> str:
+        parts = self.segments.copy()
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = _format(kwargs[name]) if name in kwargs else "{{" + name + "}}"
+        return "".join(parts)
+
+    def render_text(self, **kwargs) -> str:
+        return self.render(str, **kwargs)
+
+    def render_parsed(self, **kwargs):
+        if self.is_json:
+            return json.loads(self.render(json.dumps, **kwargs))
+        return self.render(str, **kwargs)
+
+
+_templates: dict[tuple, Template] = {}
+
+
+def get_template(_relative_path, _backup_dirs=None, _encoding="utf-8") -> Template:
+    key = (_relative_path, tuple(_backup_dirs or []), _encoding)
+    template = _templates.get(key)
+    if template is None or not template.is_current():
+        template = _templates[key] = compile_template(
+            _relative_path, _backup_dirs, _encoding
+        )
+    return template
+
+
+def compile_template(_relative_path, _backup_dirs=None, _encoding="utf-8") -> Template:
+    dependencies: dict[str, int] = {}
+    content = _read_with_includes(
+        _relative_path, _backup_dirs or [], _encoding, dependencies
+    )
+    is_json = is_full_json_template(content)
+    content = remove_code_fences(content)
+    return Template(content, is_json, dependencies)
+
+
+def _read_with_includes(_relative_path, _backup_dirs, _encoding, _dependencies):
+    absolute_path = find_file_in_dirs(_relative_path, _backup_dirs)
+    _dependencies[absolute_path] = os.stat(absolute_path).st_mtime_ns
+    with open(absolute_path, "r", encoding=_encoding) as f:
+        content = f.read()
+
+    include_pattern = re.compile(r"{{\s*include\s*['\"](.*?)['\"]\s*}}")
+    base_path = os.path.dirname(_relative_path)
+
+    def replace_include(match):
+        include_path = find_file_in_dirs(
+            os.path.join(base_path, match.group(1)), _backup_dirs
+        )
+        return _read_with_includes(
+            include_path, _backup_dirs, _encoding, _dependencies
+        )
+
+    return re.sub(include_pattern, replace_include, content)
+
+
+def render_template(_relative_path, _backup_dirs=None, _encoding="utf-8", **kwargs):
+    # cached equivalent of remove_code_fences(read_file(...))
+    template = get_template(_relative_path, _backup_dirs, _encoding)
+    return template.render_text(**kwargs)
+
+
+def parse_template(_relative_path, _backup_dirs=None, _encoding="utf-8", **kwargs):
+    # cached equivalent of parse_file(...)
+    template = get_template(_relative_path, _backup_dirs, _encoding)
+    return template.render_parsed(**kwargs)
+
+
 def replace_placeholders_text(_content: str, **kwargs):
     # Replace placeholders with values from kwargs
     for key, value in kwargs.items():
@@ -175,6 +265,29 @@ def write_file_bin(relative_path: str, content: bytes):
         f.write(content)
 
 
+def write_file_atomic(relative_path: str, content: str | bytes, encoding: str = "utf-8"):
+    # write to a temporary file and replace, readers never see a partial file
+    abs_path = get_abs_path(relative_path)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    tmp_path = f"{abs_path}.tmp"
+    data = content.encode(encoding) if isinstance(content, str) else content
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, abs_path)
+
+
+def append_file(relative_path: str, content: str, encoding: str = "utf-8", sync: bool = False):
+    abs_path = get_abs_path(relative_path)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    with open(abs_path, "a", encoding=encoding) as f:
+        f.write(content)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
 def delete_file(relative_path: str):
     abs_path = get_abs_path(relative_path)
     if os.path.exists(abs_path):
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from agent import AgentContext
+from python.helpers import change_signal, dotenv, persist_chat
+from python.helpers.print_style import PrintStyle
+
+CHECK_INTERVAL = 60  # seconds between sweeps
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(dotenv.get_dotenv_value(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_idle_ttl() -> float:
+    return _env_float("CONTEXT_IDLE_TTL", 1800)
+
+
+def get_max_active() -> int:
+    return int(_env_float("CONTEXT_MAX_ACTIVE", 50))
+
+
+lock = threading.RLock()  # taken by AgentContext.run_task, no task starts while a context hibernates
+_thread: threading.Thread | None = None
+
+
+def hibernate(context: AgentContext) -> bool:
+    # persist an idle context, free its memory and sessions, keep only metadata
+    with lock:
+        if context.is_running() or AgentContext._contexts.get(context.id) is not context:
+            return False
+        last_active = context.last_active
+    persist_chat.save_tmp_chat(context)
+    with lock:
+        # a request may have started a task while the chat was saved
+        if (
+            context.is_running()
+            or context.last_active != last_active
+            or AgentContext._contexts.get(context.id) is not context
+        ):
+            return False
+        metadata = context.metadata()
+        AgentContext.remove(context.id)
+        _close_sessions(context)
+        AgentContext._hibernated[context.id] = metadata
+        return True
+
+
+def rehydrate(ctxid: str) -> AgentContext | None:
+    with lock:
+        context = AgentContext._contexts.get(ctxid)
+        if context:
+            return context
+        metadata = AgentContext._hibernated.get(ctxid)
+        if metadata is None:
+            return None
+        context = persist_chat.load_tmp_chat(ctxid)
+        if context:
+            context.no = metadata.get("no", context.no)
+            context.name = context.name or metadata.get("name")
+        else:
+            AgentContext._hibernated.pop(ctxid, None)
+        return context
+
+
+def wake(context: AgentContext):
+    # called with the lock held, a request looked the context up before it was hibernated
+    live = AgentContext._contexts.get(context.id)
+    if live is context or (live and live.is_running()):
+        return
+    AgentContext._hibernated.pop(context.id, None)
+    AgentContext._contexts[context.id] = context
+    change_signal.notify()
+
+
+def sweep() -> int:
+    # hibernate contexts idle past the TTL and the least recently used ones over the limit
+    now = time.time()
+    ttl = get_idle_ttl()
+    idle = sorted(
+        (c for c in list(AgentContext._contexts.values()) if not c.is_running()),
+        key=lambda c: c.last_active,
+    )
+    excess = len(AgentContext._contexts) - get_max_active()
+    count = 0
+    for context in idle:
+        if count < excess or now - context.last_active > ttl:
+            try:
+                if hibernate(context):
+                    count += 1
+            except Exception as e:
+                PrintStyle.error(f"Error hibernating chat {context.id}: {e}")
+    return count
+
+
+def start():
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+
+    def run():
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            sweep()
+
+    _thread = threading.Thread(target=run, daemon=True, name="ContextHibernation")
+    _thread.start()
+
+
+def _close_sessions(context: AgentContext):
+    # shells and browsers kept in agent data, they are recreated on demand
+    for agent in context.get_agents():
+        for key, state in list(agent.data.items()):
+            if not key.startswith("_"):
+                continue
+            try:
+                if hasattr(state, "kill_task"):
+                    state.kill_task()
+                shell = getattr(state, "shell", None)
+                if shell:
+                    shell.close()
+            except Exception:
+                pass
@@ -32,11 +32,38 @@ class OutputMessage(TypedDict):
 
 class Record:
     def __init__(self):
-        pass
+        self._parent: Record | None = None  # record containing this one
+        self._tokens: int | None = None  # cached token count
+        self._text: str | None = None  # cached output_text with default labels
 
     def get_tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = self.calculate_tokens()
+        return self._tokens
+
+    def calculate_tokens(self) -> int:
         out = self.output_text()
-        return tokens.approximate_tokens(out)
+        return tokens.approximate_tokens(out, self.get_model())
+
+    def get_model(self) -> str:
+        # chat model of the agent owning the history, counted with its tokenizer
+        record = self
+        while record._parent is not None:
+            record = record._parent
+        agent = getattr(record, "agent", None)
+        return agent.config.chat_model.name if agent else ""
+
+    def invalidate(self, appended: bool = False):
+        # drop cached values of this record and of all records containing it
+        record, child = self, None
+        while record is not None:
+            record._tokens = None
+            record._text = None
+            record._changed(child, appended)
+            record, child = record._parent, record
+
+    def _changed(self, child: "Record | None", appended: bool):
+        pass
 
     @abstractmethod
     async def compress(self) -> bool:
@@ -63,14 +90,97 @@ class Record:
         return output_langchain(self.output())
 
     def output_text(self, human_label="user", ai_label="ai"):
+        if human_label == "user" and ai_label == "ai":
+            if self._text is None:
+                self._text = output_text(self.output(), ai_label, human_label)
+            return self._text
         return output_text(self.output(), ai_label, human_label)
 
 
+class RecordList(list):
+    # list of child records, invalidates cached values of the owner on every change
+
+    def __init__(self, owner: Record, records=()):
+        super().__init__(records)
+        self.owner = owner
+        self._adopt(self)
+
+    def _adopt(self, records):
+        for record in records:
+            record._parent = self.owner
+
+    def _changed(self, records=(), appended=False):
+        self._adopt(records)
+        self.owner.invalidate(appended)
+
+    def append(self, record):
+        super().append(record)
+        self._changed([record], appended=True)
+
+    def extend(self, records):
+        records = list(records)
+        super().extend(records)
+        self._changed(records, appended=True)
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    def insert(self, index, record):
+        super().insert(index, record)
+        self._changed([record])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            super().__setitem__(index, value)
+            self._changed(value)
+        else:
+            super().__setitem__(index, value)
+            self._changed([value])
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def remove(self, record):
+        super().remove(record)
+        self._changed()
+
+    def pop(self, index=-1):
+        record = super().pop(index)
+        self._changed()
+        return record
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+
 class Message(Record):
     def __init__(self, ai: bool, content: MessageContent):
+        super().__init__()
         self.ai = ai
-        self.content = content
-        self.summary: MessageContent = ""
+        self._content = content
+        self._summary: MessageContent = ""
+
+    @property
+    def content(self) -> MessageContent:
+        return self._content
+
+    @content.setter
+    def content(self, value: MessageContent):
+        self._content = value
+        self.invalidate()
+
+    @property
+    def summary(self) -> MessageContent:
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: MessageContent):
+        self._summary = value
+        self.invalidate()
 
     async def compress(self):
         return False
@@ -78,12 +188,6 @@ class Message(Record):
     def output(self):
         return [OutputMessage(ai=self.ai, content=self.summary or self.content)]
 
-    def output_langchain(self):
-        return output_langchain(self.output())
-
-    def output_text(self, human_label="user", ai_label="ai"):
-        return output_text(self.output(), ai_label, human_label)
-
     def to_dict(self):
         return {
             "_cls": "Message",
@@ -101,9 +205,34 @@ class Message(Record):
 
 class Topic(Record):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
-        self.messages: list[Message] = []
+        self.summary = ""
+        self.messages = []
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: str):
+        self._summary = value
+        self.invalidate()
+
+    @property
+    def messages(self) -> list[Message]:
+        return self._messages
+
+    @messages.setter
+    def messages(self, value: list[Message]):
+        self._messages = RecordList(self, value)
+        self.invalidate()
+
+    def calculate_tokens(self) -> int:
+        if self.summary:
+            return super().calculate_tokens()
+        count_records_tokens(self.messages, self.get_model())
+        return sum(m.get_tokens() for m in self.messages)
 
     def add_message(self, ai: bool, content: MessageContent):
         msg = Message(ai=ai, content=content)
@@ -132,9 +261,8 @@ class Topic(Record):
         large_msgs = []
         for m in (m for m in self.messages if not m.summary):
             out = m.output()
-            text = output_text(out)
-            tok = tokens.approximate_tokens(text)
-            leng = len(text)
+            tok = m.get_tokens()
+            leng = len(m.output_text())
             if tok > msg_max_size:
                 large_msgs.append((m, tok, leng, out))
         large_msgs.sort(key=lambda x: x[1], reverse=True)
@@ -200,9 +328,34 @@ class Topic(Record):
 
 class Bulk(Record):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
-        self.records: list[Record] = []
+        self.summary = ""
+        self.records = []
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: str):
+        self._summary = value
+        self.invalidate()
+
+    @property
+    def records(self) -> list[Record]:
+        return self._records
+
+    @records.setter
+    def records(self, value: list[Record]):
+        self._records = RecordList(self, value)
+        self.invalidate()
+
+    def calculate_tokens(self) -> int:
+        if self.summary:
+            return super().calculate_tokens()
+        count_records_tokens(self.records, self.get_model())
+        return sum(r.get_tokens() for r in self.records)
 
     def output(
         self, human_label: str = "user", ai_label: str = "ai"
@@ -245,11 +398,45 @@ class History(Record):
     def __init__(self, agent):
         from agent import Agent
 
-        self.bulks: list[Bulk] = []
-        self.topics: list[Topic] = []
+        super().__init__()
+        self.version = 0  # bumped on every change other than appending to the current topic
+        self.bulks = []
+        self.topics = []
         self.current = Topic(history=self)
         self.agent: Agent = agent
 
+    def _changed(self, child: "Record | None", appended: bool):
+        if not (appended and child is self.current):
+            self.version += 1
+
+    @property
+    def bulks(self) -> list[Bulk]:
+        return self._bulks
+
+    @bulks.setter
+    def bulks(self, value: list[Bulk]):
+        self._bulks = RecordList(self, value)
+        self.invalidate()
+
+    @property
+    def topics(self) -> list[Topic]:
+        return self._topics
+
+    @topics.setter
+    def topics(self, value: list[Topic]):
+        self._topics = RecordList(self, value)
+        self.invalidate()
+
+    @property
+    def current(self) -> Topic:
+        return self._current
+
+    @current.setter
+    def current(self, value: Topic):
+        self._current = value
+        value._parent = self
+        self.invalidate()
+
     def is_over_limit(self):
         limit = get_ctx_size_for_history()
         total = self.get_tokens()
@@ -264,7 +451,7 @@ class History(Record):
     def get_current_topic_tokens(self) -> int:
         return self.current.get_tokens()
 
-    def get_tokens(self) -> int:
+    def calculate_tokens(self) -> int:
         return (
             self.get_bulks_tokens()
             + self.get_topics_tokens()
@@ -386,14 +573,23 @@ class History(Record):
         return bulk
 
 
-def deserialize_history(json_data: str, agent) -> History:
+def deserialize_history(json_data: str | dict, agent) -> History:
     history = History(agent=agent)
     if json_data:
-        data = json.loads(json_data)
+        data = json.loads(json_data) if isinstance(json_data, str) else json_data
         history = History.from_dict(data, history=history)
     return history
 
 
+def count_records_tokens(records: list[Record], model: str = ""):
+    # count all records without a cached count in one batch
+    pending = [r for r in records if r._tokens is None and isinstance(r, Message)]
+    if len(pending) > 1:
+        counts = tokens.approximate_tokens_batch([r.output_text() for r in pending], model)
+        for record, count in zip(pending, counts):
+            record._tokens = count
+
+
 def get_ctx_size_for_history() -> int:
     set = settings.get_settings()
     return int(set["chat_model_ctx_length"] * set["chat_model_ctx_history"])
@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 import json
+import threading
 from typing import Any, Literal, Optional, Dict
 import uuid
-from collections import OrderedDict  # Import OrderedDict
+from collections import OrderedDict, deque  # Import OrderedDict
+from python.helpers import change_signal
 
 Type = Literal[
     "agent",
@@ -22,6 +24,39 @@ Type = Literal[
 
 ProgressUpdate = Literal["persistent", "temporary", "none"]
 
+CHECKPOINTS = 32  # lengths of appended values kept per field, older clients get full values
+
+
+class FieldTrack:
+    # versions and lengths of a string value that was only appended to since version reset
+    def __init__(self, version: int, value: Any):
+        self.reset = version
+        self.lengths: deque[tuple[int, int]] = deque(maxlen=CHECKPOINTS)
+        self.lengths.append((version, len(value) if isinstance(value, str) else -1))
+
+    @property
+    def version(self) -> int:
+        return self.lengths[-1][0]
+
+    def update(self, version: int, old: Any, new: Any) -> "FieldTrack":
+        if isinstance(old, str) and isinstance(new, str) and new.startswith(old):
+            if len(new) != len(old):
+                self.lengths.append((version, len(new)))
+            return self
+        if new == old and (new is not old or not isinstance(new, (dict, list))):
+            return self  # unchanged, the same container again may have changed in place
+        return FieldTrack(version, new)
+
+    def delta(self, since: int) -> tuple[str, int]:
+        # "same", "append" with length known to the client or "full"
+        if self.version <= since:
+            return "same", 0
+        if since >= self.reset:
+            for version, length in reversed(self.lengths):
+                if version <= since and length >= 0:
+                    return "append", length
+        return "full", 0
+
 
 @dataclass
 class LogItem:
@@ -35,6 +70,9 @@ class LogItem:
     kvps: Optional[OrderedDict] = None  # Use OrderedDict for kvps
     id: Optional[str] = None  # Add id field
     guid: str = ""
+    version: int = 0  # log version of the last change
+    created: int = 0  # log version when the item was added
+    tracks: Dict[str, FieldTrack] = field(default_factory=dict, repr=False)
 
     def __post_init__(self):
         self.guid = self.log.guid
@@ -87,13 +125,72 @@ class LogItem:
             "kvps": self.kvps,
         }
 
+    def output_delta(self, since: int):
+        # only what changed after the given log version, appended strings as suffixes
+        if self.created > since:
+            return self.output()
+        out: dict[str, Any] = {
+            "no": self.no,
+            "id": self.id,
+            "type": self.type,
+            "temp": self.temp,
+        }
+        for name in ("heading", "content"):
+            value = getattr(self, name)
+            mode, length = self.tracks[name].delta(since)
+            if mode == "append":
+                out[name + "_append"] = value[length:]
+            elif mode == "full":
+                out[name] = value
+
+        kvps = self.kvps or {}
+        mode, _ = self.tracks["kvps"].delta(since)
+        if mode != "same":
+            out["kvps"] = kvps  # keys were removed
+        else:
+            changed, appended = {}, {}
+            for key, value in kvps.items():
+                mode, length = self.tracks["kvps." + key].delta(since)
+                if mode == "full":
+                    changed[key] = value
+                elif mode == "append":
+                    appended[key] = value[length:]
+            if changed:
+                out["kvps_set"] = changed
+            if appended:
+                out["kvps_append"] = appended
+        return out
+
+    def _track(self, version: int, name: str, old: Any, new: Any):
+        track = self.tracks.get(name)
+        self.tracks[name] = track.update(version, old, new) if track else FieldTrack(version, new)
+
+    def _replace_kvps(self, version: int, kvps: dict):
+        # kvps replaced as a whole, still tracked by key unless keys were removed
+        old = self.kvps or {}
+        self.kvps = OrderedDict(kvps)
+        if old is kvps or any(key not in self.kvps for key in old):
+            self._track_kvps(version)
+            return
+        for key, value in self.kvps.items():
+            self._track(version, "kvps." + key, old.get(key), value)
+
+    def _track_kvps(self, version: int):
+        # kvps replaced as a whole
+        self.tracks = {k: v for k, v in self.tracks.items() if not k.startswith("kvps")}
+        self.tracks["kvps"] = FieldTrack(version, None)
+        for key, value in (self.kvps or {}).items():
+            self.tracks["kvps." + key] = FieldTrack(version, value)
+
 
 class Log:
 
     def __init__(self):
         self.guid: str = str(uuid.uuid4())
-        self.updates: list[int] = []
+        self.version = 0
+        self.changes: OrderedDict[int, int] = OrderedDict()  # item no to version of its last change
         self.logs: list[LogItem] = []
+        self._lock = threading.RLock()  # updates from agent threads, output for web requests
         self.set_initial_progress()
 
     def log(
@@ -110,24 +207,33 @@ class Log:
         # Use OrderedDict if kvps is provided
         if kvps is not None:
             kvps = OrderedDict(kvps)
-        item = LogItem(
-            log=self,
-            no=len(self.logs),
-            type=type,
-            heading=heading or "",
-            content=content or "",
-            kvps=OrderedDict({**(kvps or {}), **(kwargs or {})}),
-            update_progress=(
-                update_progress if update_progress is not None else "persistent"
-            ),
-            temp=temp if temp is not None else False,
-            id=id,  # Pass id to LogItem
-        )
-        self.logs.append(item)
-        self.updates += [item.no]
-        self._update_progress_from_item(item)
+        with self._lock:
+            item = LogItem(
+                log=self,
+                no=len(self.logs),
+                type=type,
+                heading=heading or "",
+                content=content or "",
+                kvps=OrderedDict({**(kvps or {}), **(kwargs or {})}),
+                update_progress=(
+                    update_progress if update_progress is not None else "persistent"
+                ),
+                temp=temp if temp is not None else False,
+                id=id,  # Pass id to LogItem
+            )
+            self.add_item(item)
+            self._update_progress_from_item(item)
         return item
 
+    def add_item(self, item: LogItem):
+        with self._lock:
+            self.logs.append(item)
+            version = self._changed(item)
+            item.created = version
+            item._track(version, "heading", None, item.heading)
+            item._track(version, "content", None, item.content)
+            item._track_kvps(version)
+
     def _update_item(
         self,
         no: int,
@@ -139,29 +245,51 @@ class Log:
         update_progress: ProgressUpdate | None = None,
         **kwargs,
     ):
-        item = self.logs[no]
-        if type is not None:
-            item.type = type
-        if update_progress is not None:
-            item.update_progress = update_progress
-        if heading is not None:
-            item.heading = heading
-        if content is not None:
-            item.content = content
-        if kvps is not None:
-            item.kvps = OrderedDict(kvps)  # Use OrderedDict to keep the order
+        with self._lock:
+            item = self.logs[no]
+            version = self.version + 1
+            if type is not None:
+                item.type = type
+            if update_progress is not None:
+                item.update_progress = update_progress
+            if heading is not None:
+                item._track(version, "heading", item.heading, heading)
+                item.heading = heading
+            if content is not None:
+                item._track(version, "content", item.content, content)
+                item.content = content
+            if kvps is not None:
+                item._replace_kvps(version, kvps)
 
-        if temp is not None:
-            item.temp = temp
+            if temp is not None:
+                item.temp = temp
 
-        if kwargs:
-            if item.kvps is None:
-                item.kvps = OrderedDict()  # Ensure kvps is an OrderedDict
-            for k, v in kwargs.items():
-                item.kvps[k] = v
+            if kwargs:
+                if item.kvps is None:
+                    item.kvps = OrderedDict()  # Ensure kvps is an OrderedDict
+                for k, v in kwargs.items():
+                    item._track(version, "kvps." + k, item.kvps.get(k), v)
+                    item.kvps[k] = v
 
-        self.updates += [item.no]
-        self._update_progress_from_item(item)
+            self._changed(item)
+            self._update_progress_from_item(item)
+
+    def _changed(self, item: LogItem) -> int:
+        self.version += 1
+        item.version = self.version
+        self.changes[item.no] = self.version
+        self.changes.move_to_end(item.no)
+        change_signal.notify()
+        return self.version
+
+    def changed_since(self, version: int) -> list[int]:
+        # numbers of items changed after the given version, in item order
+        changed = []
+        for no, ver in reversed(self.changes.items()):
+            if ver <= version:
+                break
+            changed.append(no)
+        return sorted(changed)
 
     def set_progress(self, progress: str, no: int = 0, active: bool = True):
         self.progress = progress
@@ -169,30 +297,42 @@ class Log:
             no = len(self.logs)
         self.progress_no = no
         self.progress_active = active
+        change_signal.notify()
 
     def set_initial_progress(self):
         self.set_progress("Waiting for input", 0, False)
 
     def output(self, start=None, end=None):
+        # full items changed after version start
         if start is None:
             start = 0
-        if end is None:
-            end = len(self.updates)
-
         out = []
-        seen = set()
-        for update in self.updates[start:end]:
-            if update not in seen:
-                out.append(self.logs[update].output())
-                seen.add(update)
-
+        for no in self.changed_since(start):
+            item = self.logs[no]
+            if end is None or item.version <= end:
+                out.append(item.output())
         return out
 
+    def output_delta(self, start=0):
+        return [self.logs[no].output_delta(start) for no in self.changed_since(start)]
+
+    def output_for(
+        self, start=0, guid: str | None = None, delta: bool = False
+    ) -> tuple[list[dict], int]:
+        # items a client with log guid and version start is missing, and the version they bring it to
+        with self._lock:
+            if (guid and guid != self.guid) or start > self.version:
+                start = 0  # a different or reloaded log, send it all
+            out = self.output_delta(start) if delta else self.output(start)
+            return out, self.version
+
     def reset(self):
-        self.guid = str(uuid.uuid4())
-        self.updates = []
-        self.logs = []
-        self.set_initial_progress()
+        with self._lock:
+            self.guid = str(uuid.uuid4())
+            self.version = 0
+            self.changes = OrderedDict()
+            self.logs = []
+            self.set_initial_progress()
 
     def _update_progress_from_item(self, item: LogItem):
         if item.heading and item.update_progress != "none":
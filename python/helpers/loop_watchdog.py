@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Any, TYPE_CHECKING
+
+from python.helpers import dotenv
+
+if TYPE_CHECKING:
+    from python.helpers.defer import EventLoopThread
+
+INTERVAL = 0.1  # heartbeat period in seconds
+STACK_DEPTH = 12  # frames kept per captured stack
+TOP_OFFENDERS = 20
+PENDING_TIMEOUT = 30  # seconds a captured stack waits for the heartbeat to report its lag
+
+# id of the agent context a task works for, tasks created by it inherit the id
+context_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "context_id", default=None
+)
+_task_contexts: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+
+def is_enabled() -> bool:
+    return str(dotenv.get_dotenv_value("LOOP_WATCHDOG", "false")).lower() == "true"
+
+
+def get_threshold() -> float:
+    try:
+        return float(dotenv.get_dotenv_value("LOOP_WATCHDOG_THRESHOLD", 250)) / 1000
+    except (TypeError, ValueError):
+        return 0.25
+
+
+def set_context(ctxid: str):
+    # called from the task running a context, the watchdog looks up the task, not its frames
+    context_id.set(ctxid)
+    task = asyncio.current_task()
+    if task:
+        _task_contexts[task] = ctxid
+
+
+def _task_factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    context = kwargs.get("context")
+    ctxid = context.get(context_id) if context is not None else context_id.get()
+    if ctxid:
+        _task_contexts[task] = ctxid
+    return task
+
+
+class Offender:
+    def __init__(self, key: str, stack: list[str]):
+        self.key = key
+        self.stack = stack
+        self.count = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_seen = 0.0
+
+    def output(self) -> dict[str, Any]:
+        return {
+            "location": self.key,
+            "count": self.count,
+            "total_lag": round(self.total_lag, 3),
+            "max_lag": round(self.max_lag, 3),
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class LoopWatchdog:
+    """Measures scheduling lag of an event loop thread and captures the stack of blocking code."""
+
+    _instances: dict[str, "LoopWatchdog"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, loop_thread: "EventLoopThread", threshold: float):
+        self.loop_thread = loop_thread
+        self.threshold = threshold
+        self.beat = time.monotonic()
+        self.lag_count = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.offenders: dict[str, Offender] = {}
+        self._pending: tuple[Offender, str | None, float] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._monitor: threading.Thread | None = None
+
+    @classmethod
+    def attach(cls, loop_thread: "EventLoopThread") -> "LoopWatchdog | None":
+        if not is_enabled():
+            return None
+        with cls._lock:
+            watchdog = cls._instances.get(loop_thread.thread_name)
+            if not watchdog:
+                watchdog = cls._instances[loop_thread.thread_name] = LoopWatchdog(
+                    loop_thread, get_threshold()
+                )
+        watchdog.start()
+        return watchdog
+
+    @classmethod
+    def get_stats(cls) -> list[dict[str, Any]]:
+        with cls._lock:
+            watchdogs = list(cls._instances.values())
+        return [w.stats() for w in watchdogs]
+
+    def start(self):
+        loop = self.loop_thread.loop
+        if not loop or loop is self._loop:
+            return
+        self._loop = loop
+        self.beat = time.monotonic()
+        loop.call_soon_threadsafe(self._set_task_factory, loop)
+        asyncio.run_coroutine_threadsafe(self._heartbeat(loop), loop)
+        if not self._monitor or not self._monitor.is_alive():
+            self._monitor = threading.Thread(
+                target=self._watch,
+                daemon=True,
+                name=f"{self.loop_thread.thread_name}-watchdog",
+            )
+            self._monitor.start()
+
+    def _set_task_factory(self, loop: asyncio.AbstractEventLoop):
+        if loop.get_task_factory() is None:
+            loop.set_task_factory(_task_factory)
+
+    async def _heartbeat(self, loop: asyncio.AbstractEventLoop):
+        while self._loop is loop:
+            expected = time.monotonic() + INTERVAL
+            await asyncio.sleep(INTERVAL)
+            now = time.monotonic()
+            self.beat = now
+            lag = now - expected
+            if lag >= self.threshold:
+                self._record(lag)
+            else:
+                self._pending = None  # captured just before the loop caught up
+
+    def _watch(self):
+        # runs on its own thread, catches the loop thread while it is still blocked
+        while True:
+            time.sleep(INTERVAL)
+            now = time.monotonic()
+            pending = self._pending
+            if pending and now - pending[2] < PENDING_TIMEOUT:
+                continue
+            self._pending = None  # the heartbeat did not report it, the loop may be gone
+            if now - self.beat < self.threshold + INTERVAL:
+                continue
+            thread = self.loop_thread.thread
+            loop = self._loop
+            frame = sys._current_frames().get(thread.ident) if thread else None  # type: ignore
+            if frame is None or loop is None:
+                continue
+            task = asyncio.current_task(loop)
+            stack = traceback.format_stack(frame)[-STACK_DEPTH:]
+            key = _frame_location(frame)
+            with self._lock:
+                offender = self.offenders.get(key)
+                if not offender:
+                    offender = self.offenders[key] = Offender(key, stack)
+                offender.stack = stack
+            self._pending = (offender, _task_contexts.get(task) if task else None, now)
+
+    def _record(self, lag: float):
+        self.lag_count += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        pending, self._pending = self._pending, None
+        if not pending:
+            return
+        offender, ctxid, _ = pending
+        with self._lock:
+            offender.count += 1
+            offender.total_lag += lag
+            offender.max_lag = max(offender.max_lag, lag)
+            offender.last_seen = time.time()
+            if len(self.offenders) > TOP_OFFENDERS * 2:
+                for key in sorted(self.offenders, key=lambda k: self.offenders[k].total_lag)[
+                    :TOP_OFFENDERS
+                ]:
+                    del self.offenders[key]
+        from agent import AgentContext
+
+        context = AgentContext._contexts.get(ctxid) if ctxid else None
+        if context:
+            context.log.log(
+                type="warning",
+                heading=f"Event loop blocked for {lag * 1000:.0f} ms",
+                content="".join(offender.stack),
+                kvps={"location": offender.key, "thread": self.loop_thread.thread_name},
+            )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            offenders = sorted(
+                self.offenders.values(), key=lambda o: o.total_lag, reverse=True
+            )[:TOP_OFFENDERS]
+            return {
+                "thread": self.loop_thread.thread_name,
+                "threshold": self.threshold,
+                "lag": round(max(0.0, time.monotonic() - self.beat - INTERVAL), 3),
+                "lag_count": self.lag_count,
+                "max_lag": round(self.max_lag, 3),
+                "total_lag": round(self.total_lag, 3),
+                "offenders": [o.output() for o in offenders],
+            }
+
+
+def _frame_location(frame) -> str:
+    # innermost frame of project code, library frames are not actionable
+    f = frame
+    while f:
+        filename = f.f_code.co_filename
+        if "site-packages" not in filename and not filename.startswith(
+            (sys.prefix, sys.base_prefix)
+        ):
+            return f"{filename}:{f.f_lineno} {f.f_code.co_name}"
+        f = f.f_back
+    return f"{frame.f_code.co_filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
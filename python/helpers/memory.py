@@ -1,4 +1,7 @@
+import ast
+import asyncio
 from datetime import datetime
+from functools import lru_cache
 from typing import Any, List, Sequence
 from langchain.storage import InMemoryByteStore, LocalFileStore
 from langchain.embeddings import CacheBackedEmbeddings
@@ -6,13 +9,12 @@ from langchain.embeddings import CacheBackedEmbeddings
 # from langchain_chroma import Chroma
 from langchain_community.vectorstores import FAISS
 import faiss
-from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores.utils import (
     DistanceStrategy,
 )
 from langchain_core.embeddings import Embeddings
 
-import os, json
+import os, json, pickle
 
 import numpy as np
 
@@ -22,20 +24,174 @@ from langchain_core.documents import Document
 import uuid
 from python.helpers import knowledge_import
 from python.helpers.log import Log, LogItem
+from python.helpers.memory_wal import INDEX_FILES, MemoryWal
+from python.helpers.memory_docstore import MemoryDocstore
+from python.helpers import memory_index
+from python.helpers.memory_vectors import VectorFile
+from python.helpers import memory_vectors
 from enum import Enum
 from agent import Agent
 import models
 
 
 class MyFaiss(FAISS):
+    area_positions: dict[str, list[int]] | None = None  # index positions by memory area
+    area_indexed = 0  # positions below this are in area_positions
+    deletions = 0  # positions shift on delete, index rebuilds check this
+    vector_file: VectorFile | None = None  # exact vectors to re-rank quantized results
+    mapped_index: Any = None  # the index as read from its file, copied before changes
+    migrated = False  # documents were read from a pickled docstore of an older version
+    # positions of deleted vectors still in a graph index, mapped to "" in index_to_docstore_id
+    removed_positions = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def load_folder(cls, db_dir: str, embeddings: Embeddings, **kwargs) -> "MyFaiss":
+        # the index is memory mapped and documents are read from sqlite when needed
+        index = memory_index.read(os.path.join(db_dir, INDEX_FILES[0]))
+        with open(os.path.join(db_dir, INDEX_FILES[1]), "rb") as f:
+            docs, index_to_docstore_id = pickle.load(f)
+        docstore = MemoryDocstore(db_dir)
+        if docs is not None:
+            # pickled docstore of older versions
+            docstore.migrate(docs._dict)
+        db = cls(embeddings, index, docstore, index_to_docstore_id, **kwargs)
+        db.mapped_index = index
+        db.migrated = docs is not None
+        db.removed_positions = np.array(
+            [p for p, id in index_to_docstore_id.items() if id == ""], dtype=np.int64
+        )
+        return db
+
+    def _writable(self):
+        if self.index is self.mapped_index:
+            self.index = memory_index.writable(self.index)
+        self.mapped_index = None
+
     # override aget_by_ids
     def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
         # return all self.docstore._dict[id] in ids
-        return [self.docstore._dict[id] for id in (ids if isinstance(ids, list) else [ids]) if id in self.docstore._dict]  # type: ignore
+        found = self.docstore._dict.get_many(ids if isinstance(ids, list) else [ids])  # type: ignore
+        return list(found.values())
 
     async def aget_by_ids(self, ids: Sequence[str], /) -> List[Document]:
         return self.get_by_ids(ids)
 
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        text_embeddings = list(text_embeddings)
+        self._writable()
+        ids = super().add_embeddings(text_embeddings, metadatas=metadatas, ids=ids, **kwargs)
+        if self.vector_file:
+            self.vector_file.append(ids, [e for _, e in text_embeddings])
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs):
+        # positions after the deleted ones shift, rebuild on next use
+        self.area_positions = None
+        self.deletions += 1
+        self._writable()
+        if ids and self.vector_file:
+            self.vector_file.remove(ids)
+        if ids and memory_index.get_index_type(self.index) != "flat":
+            return self._delete_positions(ids)
+        return super().delete(ids, **kwargs)
+
+    def _delete_positions(self, ids: list[str]):
+        # ann indexes do not shift positions on remove_ids like the flat index langchain expects
+        removed = set(ids)
+        positions = [p for p, id in self.index_to_docstore_id.items() if id in removed]
+        if memory_index.get_index_type(self.index) in memory_index.TOMBSTONE_TYPES:
+            # searches skip them until the upgrader rebuilds the graph
+            self.index_to_docstore_id.update((p, "") for p in positions)
+            self.removed_positions = np.union1d(self.removed_positions, positions).astype(np.int64)
+        else:
+            self.index = memory_index.remove(self.index, positions)
+            remaining = [
+                id for _, id in sorted(self.index_to_docstore_id.items()) if id not in removed
+            ]
+            self.index_to_docstore_id = dict(enumerate(remaining))
+        self.docstore.delete([id for id in ids if id in self.docstore._dict])  # type: ignore
+        return True
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter=None, fetch_k: int = 20, **kwargs
+    ):
+        if not self.vector_file:
+            return self._search_by_vector(embedding, k, filter=filter, fetch_k=fetch_k, **kwargs)
+        # over-fetch from the quantized index, exact scores decide the final order
+        threshold = kwargs.pop("score_threshold", None)
+        fetch = k * memory_vectors.get_rerank_factor()
+        docs = self._search_by_vector(
+            embedding, fetch, filter=filter, fetch_k=max(fetch_k, fetch), **kwargs
+        )
+        return self._apply_threshold(self.rerank(embedding, docs, k), threshold)
+
+    def _search_by_vector(
+        self, embedding: List[float], k: int, filter=None, fetch_k: int = 20, **kwargs
+    ) -> list[tuple[Document, float]]:
+        # the langchain search, except that removed graph positions are skipped
+        if not len(self.removed_positions):
+            return super().similarity_search_with_score_by_vector(
+                embedding, k, filter=filter, fetch_k=fetch_k, **kwargs
+            )
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        scores, indices = memory_index.search(
+            self.index, vector, k if filter is None else fetch_k, removed=self.removed_positions
+        )
+        hits = [(s, self.index_to_docstore_id[p]) for s, p in zip(scores[0], indices[0]) if p >= 0]
+        found = self.docstore._dict.get_many([id for _, id in hits])  # type: ignore
+        docs = [(found[id], score) for score, id in hits if id in found]
+        if filter is not None:
+            filter_func = self._create_filter_func(filter)
+            docs = [(doc, score) for doc, score in docs if filter_func(doc.metadata)]
+        return self._apply_threshold(docs, kwargs.get("score_threshold"))[:k]
+
+    def _apply_threshold(
+        self, docs: list[tuple[Document, float]], threshold: float | None
+    ) -> list[tuple[Document, float]]:
+        if threshold is None:
+            return docs
+        # same comparison as the langchain implementation
+        if self.distance_strategy in (
+            DistanceStrategy.MAX_INNER_PRODUCT,
+            DistanceStrategy.JACCARD,
+        ):
+            return [(doc, score) for doc, score in docs if score >= threshold]
+        return [(doc, score) for doc, score in docs if score <= threshold]
+
+    def rerank(
+        self, embedding: List[float], docs_and_scores: list[tuple[Document, float]], k: int
+    ) -> list[tuple[Document, float]]:
+        # documents without a stored vector keep their approximate score
+        if not self.vector_file or not docs_and_scores:
+            return docs_and_scores[:k]
+        exact = self.vector_file.scores(
+            [doc.metadata.get("id", "") for doc, _ in docs_and_scores], embedding
+        )
+        rescored = [
+            (doc, score if e is None else e)
+            for (doc, score), e in zip(docs_and_scores, exact)
+        ]
+        rescored.sort(key=lambda d: d[1], reverse=True)
+        return rescored[:k]
+
+    def get_area_positions(self, areas: set[str]) -> np.ndarray:
+        # new documents are only appended, so only positions added since the last call are read
+        if self.area_positions is None:
+            self.area_positions, self.area_indexed = {}, 0
+        new = range(self.area_indexed, self.index.ntotal)
+        docs = self.docstore._dict.get_many(  # type: ignore
+            [self.index_to_docstore_id[p] for p in new if p in self.index_to_docstore_id]
+        )
+        for position in new:
+            doc = docs.get(self.index_to_docstore_id.get(position))  # type: ignore
+            if doc:  # removed graph positions have no document
+                self.area_positions.setdefault(doc.metadata.get("area", ""), []).append(position)
+        self.area_indexed = self.index.ntotal
+        positions = [p for area in areas for p in self.area_positions.get(area, [])]
+        return np.array(positions, dtype=np.int64)
+
 
 class Memory:
 
@@ -115,42 +271,67 @@ class Memory:
             store = LocalFileStore(em_dir)
 
         # here we setup the embeddings model with the chosen cache storage
+        namespace = getattr(
+            embeddings_model,
+            "model",
+            getattr(embeddings_model, "model_name", "default"),
+        )
         embedder = CacheBackedEmbeddings.from_bytes_store(
             embeddings_model,
             store,
-            namespace=getattr(
-                embeddings_model,
-                "model",
-                getattr(embeddings_model, "model_name", "default"),
-            ),
+            namespace=namespace,
         )
 
         # self.db = Chroma(
         #     embedding_function=self.embedder,
         #     persist_directory=db_dir)
 
+        wal = MemoryWal.get(db_dir)
+        wal.recover_files()
+
         # if db folder exists and is not empty:
         if os.path.exists(db_dir) and files.exists(db_dir, "index.faiss"):
-            db = MyFaiss.load_local(
-                folder_path=db_dir,
-                embeddings=embedder,
-                allow_dangerous_deserialization=True,
+            db = MyFaiss.load_folder(
+                db_dir,
+                embedder,
                 distance_strategy=DistanceStrategy.COSINE,
                 # normalize_L2=True,
                 relevance_score_fn=Memory._cosine_normalizer,
             )
+            memory_index.configure(db.index)
         else:
-            index = faiss.IndexFlatIP(len(embedder.embed_query("example")))
+            index = memory_index.create(
+                memory_index.get_target_type(memory_index.get_configured_type(db_dir), 0),
+                memory_index.get_dimensions(
+                    db_dir,
+                    namespace,
+                    lambda: len(embedder.embed_query("example")),
+                ),
+            )
 
             db = MyFaiss(
                 embedding_function=embedder,
                 index=index,
-                docstore=InMemoryDocstore(),
+                docstore=MemoryDocstore(db_dir),
                 index_to_docstore_id={},
                 distance_strategy=DistanceStrategy.COSINE,
                 # normalize_L2=True,
                 relevance_score_fn=Memory._cosine_normalizer,
             )
+
+        # exact vectors for re-ranking, before the replay appends to them
+        if memory_vectors.is_enabled(db_dir):
+            db.vector_file = VectorFile(db_dir, db.index.d)
+
+        # changes after the last checkpoint
+        replayed = wal.attach(db)
+        if replayed and log_item:
+            log_item.stream(progress=f"\nRecovered {replayed} memory changes")
+        if db.migrated:
+            wal.mark_dirty()  # the next checkpoint drops the documents from index.pkl
+
+        # rebuild as the configured index type in background when needed
+        memory_index.Upgrader.check(db_dir, db, wal)
         return db  # type: ignore
 
     def __init__(
@@ -247,6 +428,11 @@ class Memory:
         await self.agent.rate_limiter(
             model_config=self.agent.config.embeddings_model, input=query)
 
+        # filters by area only search the vectors of those areas
+        areas = Memory._get_filter_areas(filter) if filter else None
+        if areas is not None:
+            return await self._search_areas(query, limit, threshold, areas)
+
         return await self.db.asearch(
             query,
             search_type="similarity_score_threshold",
@@ -255,6 +441,34 @@ class Memory:
             filter=comparator,
         )
 
+    async def _search_areas(
+        self, query: str, limit: int, threshold: float, areas: set[str]
+    ) -> list[Document]:
+        embedding = await self.db.embedding_function.aembed_query(query)  # type: ignore
+        wal = self._get_wal()
+
+        def search():
+            positions = self.db.get_area_positions(areas)
+            if not len(positions):
+                return []
+            fetch = limit * memory_vectors.get_rerank_factor() if self.db.vector_file else limit
+            scores, indices = memory_index.search(
+                self.db.index, np.array([embedding], dtype=np.float32), fetch, positions
+            )
+            hits = [(s, self.db.index_to_docstore_id[p]) for s, p in zip(scores[0], indices[0]) if p >= 0]
+            docs = self.db.docstore._dict.get_many([id for _, id in hits])  # type: ignore
+            found = [(docs[id], float(score)) for score, id in hits if id in docs]
+            found = self.db.rerank(embedding, found, limit)
+            return [
+                doc for doc, score in found if Memory._cosine_normalizer(score) >= threshold
+            ]
+
+        def search_locked():
+            with wal.lock:  # no inserts or deletes while positions are used
+                return search()
+
+        return await asyncio.to_thread(search_locked)
+
     async def delete_documents_by_query(
         self, query: str, threshold: float, filter: str = ""
     ):
@@ -278,15 +492,13 @@ class Memory:
                 # fnd = self.db.get(where={"id": {"$in": document_ids}})
                 # if fnd["ids"]: self.db.delete(ids=fnd["ids"])
                 # tot += len(fnd["ids"])
-                self.db.delete(ids=document_ids)
+                self._delete(document_ids)
                 tot += len(document_ids)
 
             # If fewer than K document IDs, break the loop
             if len(document_ids) < k:
                 break
 
-        if tot:
-            self._save_db()  # persist
         return removed
 
     async def delete_documents_by_ids(self, ids: list[str]):
@@ -294,10 +506,7 @@ class Memory:
         rem_docs = self.db.get_by_ids(ids)  # existing docs to remove (prevents error)
         if rem_docs:
             rem_ids = [doc.metadata["id"] for doc in rem_docs]  # ids to remove
-            await self.db.adelete(ids=rem_ids)
-
-        if rem_docs:
-            self._save_db()  # persist
+            self._delete(rem_ids)
         return rem_docs
 
     async def insert_text(self, text, metadata: dict = {}):
@@ -322,24 +531,61 @@ class Memory:
             await self.agent.rate_limiter(
                 model_config=self.agent.config.embeddings_model, input=docs_txt)
 
-            self.db.add_documents(documents=docs, ids=ids)
-            self._save_db()  # persist
+            texts = [doc.page_content for doc in docs]
+            metadatas = [doc.metadata for doc in docs]
+            embeddings = self.db.embedding_function.embed_documents(texts)  # type: ignore
+            wal = self._get_wal()
+            with wal.lock:
+                self.db.add_embeddings(
+                    list(zip(texts, embeddings)), metadatas=metadatas, ids=ids
+                )
+                wal.log_add(ids, texts, embeddings, metadatas)  # persist
+            memory_index.Upgrader.check(
+                self._abs_db_dir(self.memory_subdir), self.db, wal
+            )
         return ids
 
-    def _save_db(self):
-        self.db.save_local(folder_path=self._abs_db_dir(self.memory_subdir))
+    def _delete(self, ids: list[str]):
+        wal = self._get_wal()
+        with wal.lock:
+            self.db.delete(ids=ids)
+            wal.log_delete(ids)  # persist
+        # graphs are rebuilt without the removed vectors in background
+        memory_index.Upgrader.check(self._abs_db_dir(self.memory_subdir), self.db, wal)
+
+    def _get_wal(self) -> MemoryWal:
+        return MemoryWal.get(self._abs_db_dir(self.memory_subdir))
 
     @staticmethod
     def _get_comparator(condition: str):
+        code = Memory._compile_filter(condition)
+
         def comparator(data: dict[str, Any]):
             try:
-                return eval(condition, {}, data)
+                return eval(code, {}, data)  # type: ignore
             except Exception as e:
                 # PrintStyle.error(f"Error evaluating condition: {e}")
                 return False
 
         return comparator
 
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _compile_filter(condition: str):
+        try:
+            return compile(condition, "<filter>", "eval")
+        except SyntaxError:
+            return compile("False", "<filter>", "eval")
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _get_filter_areas(condition: str) -> frozenset[str] | None:
+        # areas of filters like "area == 'x' or area == 'y'" or "area in ['x', 'y']", None for other filters
+        try:
+            return _filter_areas(ast.parse(condition, mode="eval").body)
+        except SyntaxError:
+            return None
+
     @staticmethod
     def _score_normalizer(val: float) -> float:
         res = 1 - 1 / (1 + np.exp(val))
@@ -373,6 +619,32 @@ class Memory:
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+def _filter_areas(node: ast.AST) -> frozenset[str] | None:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.Or):
+        areas = frozenset()
+        for value in node.values:
+            sub = _filter_areas(value)
+            if sub is None:
+                return None
+            areas |= sub
+        return areas
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if isinstance(op, ast.Eq) and isinstance(right, ast.Name):
+            left, right = right, left
+        if not (isinstance(left, ast.Name) and left.id == "area"):
+            return None
+        if isinstance(op, ast.Eq):
+            values = [right]
+        elif isinstance(op, ast.In) and isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+            values = right.elts
+        else:
+            return None
+        if all(isinstance(v, ast.Constant) and isinstance(v.value, str) for v in values):
+            return frozenset(v.value for v in values)  # type: ignore
+    return None
+
+
 def get_memory_subdir_abs(agent: Agent) -> str:
     return files.get_abs_path("memory", agent.config.memory_subdir or "default")
 
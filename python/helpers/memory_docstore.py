@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from typing import Iterator
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# memory documents in sqlite, read one by one when searches need them instead of
+# unpickling all of them on load, changes since the last checkpoint are kept in memory
+DOCSTORE_FILE = "docstore.db"
+BATCH = 500  # ids per select, below the sqlite variable limit
+
+_DELETED = None
+
+
+class DocumentMap(MutableMapping):
+    # dict interface over the pending changes, the changes being committed and the database
+    def __init__(self, store: "MemoryDocstore"):
+        self.store = store
+
+    def __getitem__(self, id: str) -> Document:
+        doc = self.get(id)
+        if doc is None:
+            raise KeyError(id)
+        return doc
+
+    def __setitem__(self, id: str, doc: Document):
+        with self.store.lock:
+            self.store.changes[id] = doc
+
+    def __delitem__(self, id: str):
+        with self.store.lock:
+            if id not in self:
+                raise KeyError(id)
+            self.store.changes[id] = _DELETED
+
+    def __contains__(self, id: object) -> bool:
+        return isinstance(id, str) and self.get(id) is not None
+
+    def get(self, id, default=None):
+        if id is None:
+            return default
+        return self.get_many([id]).get(id, default)
+
+    def get_many(self, ids: list[str]) -> dict[str, Document]:
+        # one query per batch for the ids without pending changes
+        found: dict[str, Document] = {}
+        missing = []
+        with self.store.lock:
+            for id in ids:
+                for layer in (self.store.changes, self.store.committing):
+                    if id in layer:
+                        if layer[id] is not _DELETED:
+                            found[id] = layer[id]
+                        break
+                else:
+                    missing.append(id)
+            for start in range(0, len(missing), BATCH):
+                batch = missing[start : start + BATCH]
+                rows = self.store.db.execute(
+                    f"SELECT id, text, metadata FROM docs WHERE id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for id, text, metadata in rows:
+                    found[id] = Document(page_content=text, metadata=json.loads(metadata))
+        return found
+
+    def __iter__(self) -> Iterator[str]:
+        with self.store.lock:
+            pending = {**self.store.committing, **self.store.changes}
+            stored = [row[0] for row in self.store.db.execute("SELECT id FROM docs")]
+        for id in stored:
+            if pending.get(id, True) is not _DELETED:
+                yield id
+        stored_ids = set(stored)
+        for id, doc in pending.items():
+            if doc is not _DELETED and id not in stored_ids:
+                yield id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class MemoryDocstore(Docstore, AddableMixin):
+    def __init__(self, db_dir: str):
+        os.makedirs(db_dir, exist_ok=True)
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(
+            os.path.join(db_dir, DOCSTORE_FILE), check_same_thread=False, isolation_level=None
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, text TEXT, metadata TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.changes: dict[str, Document | None] = {}
+        self.committing: dict[str, Document | None] = {}
+        self._dict = DocumentMap(self)
+
+    def add(self, texts: dict[str, Document]):
+        with self.lock:
+            overlapping = [id for id in texts if id in self._dict]
+            if overlapping:
+                raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+            self.changes.update(texts)
+
+    def delete(self, ids: list):
+        with self.lock:
+            existing = [id for id in ids if id in self._dict]
+            if not existing:
+                raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+            for id in existing:
+                self.changes[id] = _DELETED
+
+    def search(self, search: str) -> str | Document:
+        doc = self._dict.get(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def migrate(self, docs: dict[str, Document]):
+        # documents of a pickled docstore, no log segment has them so they are committed right away
+        with self.lock:
+            self.changes.update(docs)
+            self.snapshot()
+        self.commit(self.get_wal())
+
+    def get_wal(self) -> int:
+        # first log segment not yet applied to the database
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'wal'").fetchone()
+        return int(row[0]) if row else 1
+
+    def snapshot(self):
+        # called with the log locked, later changes are kept apart from the committed ones
+        with self.lock:
+            self.committing.update(self.changes)
+            self.changes = {}
+
+    def commit(self, wal: int):
+        # write the snapshot in one transaction together with the log position it covers
+        with self.lock:
+            committing = dict(self.committing)
+        adds = [
+            (id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+            for id, doc in committing.items()
+            if doc is not _DELETED
+        ]
+        deletes = [(id,) for id, doc in committing.items() if doc is _DELETED]
+        with self.lock:
+            try:
+                self.db.execute("BEGIN")
+                self.db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", adds)
+                self.db.executemany("DELETE FROM docs WHERE id = ?", deletes)
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('wal', ?)", (str(wal),)
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.committing = {}  # checkpoints do not overlap, nothing was added meanwhile
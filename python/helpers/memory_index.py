@@ -0,0 +1,350 @@
+import json
+import math
+import os
+import threading
+from typing import Any, Callable
+
+import faiss
+import numpy as np
+
+from python.helpers import dotenv
+from python.helpers.print_style import PrintStyle
+
+# index types for memory folders, types that need training start as flat
+TYPES = ("auto", "flat", "fp16", "sq8", "pq", "hnsw", "ivf", "ivfpq", "ivfsq8")
+IVF_TYPES = ("ivf", "ivfpq", "ivfsq8")
+CODE_TYPES = ("flat", "fp16", "sq8", "pq")  # flat storage of full, half, 8 bit or pq codes
+LOSSY_TYPES = ("fp16", "sq8", "pq", "ivfsq8", "ivfpq")
+SELECTOR_TYPES = ("flat", "fp16", "sq8", "hnsw", "ivf", "ivfpq", "ivfsq8")  # searches take an id selector
+TOMBSTONE_TYPES = ("hnsw",)  # removed vectors stay in the index until the background rebuild
+CONFIG_FILE = "index.json"  # per memory folder settings, {"type": "sq8", "rerank": true, "dimensions": 384}
+SQ8_MIN_TRAIN = 1000  # value ranges of 8 bit codes are learned from this many vectors at least
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+TRAIN_POINTS_PER_LIST = 39  # faiss warns below this many training points per list
+MAX_TRAIN_POINTS = 256 * 1024
+PQ_SUBVECTOR = 4  # dimensions per product quantizer code byte
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(dotenv.get_dotenv_value(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_ann_threshold() -> int:
+    # documents before an "auto" memory is rebuilt as an ann index
+    return _env_int("MEMORY_ANN_THRESHOLD", 50000)
+
+
+def get_nprobe() -> int:
+    return _env_int("MEMORY_IVF_NPROBE", 16)
+
+
+def get_ef_search() -> int:
+    return _env_int("MEMORY_HNSW_EF_SEARCH", 64)
+
+
+def read_config(db_dir: str) -> dict[str, Any]:
+    try:
+        with open(os.path.join(db_dir, CONFIG_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_config(db_dir: str, config: dict[str, Any]):
+    path = os.path.join(db_dir, CONFIG_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(config, f)
+    os.replace(path + ".tmp", path)
+
+
+def get_dimensions(db_dir: str, model: str, measure: Callable[[], int]) -> int:
+    # the embedding size is remembered per model, measuring it is an embedding api call
+    config = read_config(db_dir)
+    if config.get("embeddings") == model and config.get("dimensions"):
+        return config["dimensions"]
+    dimensions = measure()
+    write_config(db_dir, {**config, "embeddings": model, "dimensions": dimensions})
+    return dimensions
+
+
+def get_configured_type(db_dir: str) -> str:
+    # index.json of the memory folder, then the environment
+    type = read_config(db_dir).get("type") or dotenv.get_dotenv_value(
+        "MEMORY_INDEX_TYPE", "auto"
+    )
+    if type not in TYPES:
+        PrintStyle.error(f"Unknown memory index type '{type}', using flat")
+        return "flat"
+    return type
+
+
+def get_index_type(index: Any) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivfsq8"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def get_target_type(configured: str, count: int) -> str:
+    # the index type a memory with count documents should use
+    if configured == "auto":
+        return "ivf" if count >= get_ann_threshold() else "flat"
+    if count < _min_train(configured, count):
+        return "flat"  # not enough vectors to train yet
+    return configured
+
+
+def create(type: str, dimensions: int, count: int = 0) -> Any:
+    # an empty index, ivf types are returned untrained
+    if type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimensions, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif type in IVF_TYPES:
+        quantizer = faiss.IndexFlatIP(dimensions)
+        nlist = _nlist(count)
+        if type == "ivfpq":
+            index = faiss.IndexIVFPQ(
+                quantizer, dimensions, nlist, _pq_m(dimensions), 8, faiss.METRIC_INNER_PRODUCT
+            )
+        elif type == "ivfsq8":
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dimensions, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.own_fields = True
+        quantizer.this.disown()  # owned by the ivf index now
+    elif type == "fp16":
+        index = faiss.IndexScalarQuantizer(
+            dimensions, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+    elif type == "sq8":
+        index = faiss.IndexScalarQuantizer(
+            dimensions, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+    elif type == "pq":
+        index = faiss.IndexPQ(dimensions, _pq_m(dimensions), 8, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexFlatIP(dimensions)
+    configure(index)
+    return index
+
+
+def read(path: str) -> Any:
+    # codes stay in the file and are paged in by searches, older faiss versions read them all
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        return faiss.read_index(path)
+    return faiss.read_index(path, flag)
+
+
+def writable(index: Any) -> Any:
+    # an in-memory copy of an index opened by read, mapped codes can not grow or shrink
+    index = faiss.deserialize_index(faiss.serialize_index(index))
+    configure(index)
+    return index
+
+
+def configure(index: Any):
+    # search time settings, they are not all persisted with the index
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = get_ef_search()
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(get_nprobe(), index.nlist)
+
+
+def build(type: str, vectors: np.ndarray) -> Any:
+    # a new index of the given type holding the vectors in the same positions
+    index = create(type, vectors.shape[1], len(vectors))
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > MAX_TRAIN_POINTS:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), MAX_TRAIN_POINTS, replace=False)]
+        index.train(sample)
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+
+def remove(index: Any, positions: list[int]) -> Any:
+    # remove vectors and shift the following positions down like a flat index does
+    # graphs can not remove vectors, see TOMBSTONE_TYPES
+    removed = np.sort(np.array(positions, dtype=np.int64))
+    type = get_index_type(index)
+    if type in CODE_TYPES:
+        index.remove_ids(removed)
+        return index
+
+    # ivf lists keep the ids of their vectors, they are renumbered after removal
+    ivf = faiss.extract_index_ivf(index)
+    had_map = ivf.direct_map.type != faiss.DirectMap.NoMap
+    ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    ivf.remove_ids(faiss.IDSelectorBatch(removed))
+    for list_no in range(ivf.nlist):
+        size = ivf.invlists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), size)
+            ids -= np.searchsorted(removed, ids)
+    if had_map:
+        ivf.make_direct_map()
+    return index
+
+
+def search_params(index: Any, selector: Any) -> Any:
+    # search parameters must match the index type
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search(
+    index: Any,
+    query: np.ndarray,
+    k: int,
+    positions: np.ndarray | None = None,
+    removed: np.ndarray | None = None,
+):
+    # the k nearest vectors among the given positions or all but the removed ones,
+    # as (scores, positions) like index.search
+    if positions is None:
+        batch = faiss.IDSelectorBatch(removed)
+        selector = faiss.IDSelectorNot(batch)
+        allowed = lambda found: ~np.isin(found, removed)
+        count = index.ntotal - len(removed)  # type: ignore
+    else:
+        selector = faiss.IDSelectorBatch(positions)
+        allowed = lambda found: np.isin(found, positions)
+        count = len(positions)
+    k = min(k, count)
+    if k <= 0:
+        return np.zeros((len(query), 0), dtype=np.float32), np.zeros((len(query), 0), dtype=np.int64)
+    if get_index_type(index) in SELECTOR_TYPES:
+        return index.search(query, k, params=search_params(index, selector))
+    # no selector support, over-fetch in proportion to the share of allowed positions and filter
+    fetch = k * max(2, 2 * index.ntotal // count)
+    while True:
+        fetch = min(fetch, index.ntotal)
+        scores, indices = index.search(query, fetch)
+        keep = allowed(indices)
+        if keep[0].sum() >= k or fetch >= index.ntotal:
+            return scores[:, keep[0]][:, :k], indices[:, keep[0]][:, :k]
+        fetch *= 4
+
+
+def get_vectors(index: Any) -> np.ndarray:
+    # all vectors of a flat or hnsw index, ivf indexes need a direct map
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _min_train(type: str, count: int) -> int:
+    minimum = 0
+    if type in IVF_TYPES:
+        minimum = TRAIN_POINTS_PER_LIST * _nlist(count)
+    if type in ("pq", "ivfpq"):
+        # codebooks of 256 centroids per sub-quantizer
+        minimum = max(minimum, TRAIN_POINTS_PER_LIST * 256)
+    if type in ("sq8", "ivfsq8"):
+        minimum = max(minimum, SQ8_MIN_TRAIN)
+    return minimum
+
+
+def _nlist(count: int) -> int:
+    return max(1, min(int(4 * math.sqrt(max(count, 1))), count // TRAIN_POINTS_PER_LIST, 65536))
+
+
+def _pq_m(dimensions: int) -> int:
+    # sub-quantizers of about PQ_SUBVECTOR dimensions, the count has to divide the dimensions
+    for m in range(max(1, dimensions // PQ_SUBVECTOR), 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 1
+
+
+class Upgrader:
+    # rebuilds memory indexes into their target type on a background thread
+    _running: set[str] = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def check(db_dir: str, db: Any, wal: Any):
+        target = get_target_type(
+            get_configured_type(db_dir), db.index.ntotal - len(db.removed_positions)
+        )
+        if target == get_index_type(db.index) and not len(db.removed_positions):
+            return
+        with Upgrader._lock:
+            if db_dir in Upgrader._running:
+                return
+            Upgrader._running.add(db_dir)
+        threading.Thread(
+            target=Upgrader._run,
+            args=(db_dir, db, wal, target),
+            daemon=True,
+            name="MemoryIndexUpgrade",
+        ).start()
+
+    @staticmethod
+    def _run(db_dir: str, db: Any, wal: Any, target: str):
+        type = get_index_type(db.index)
+        try:
+            for _ in range(3):
+                if Upgrader._upgrade(db, wal, target):
+                    if target != type:
+                        PrintStyle.standard(f"Memory index in {db_dir} rebuilt as {target}")
+                    return
+        except Exception as e:
+            PrintStyle.error(f"Error rebuilding memory index in {db_dir}: {e}")
+        finally:
+            with Upgrader._lock:
+                Upgrader._running.discard(db_dir)
+
+    @staticmethod
+    def _upgrade(db: Any, wal: Any, target: str) -> bool:
+        # train and fill the new index outside the lock, then catch up and swap
+        with wal.lock:
+            old = db.index
+            deletions = db.deletions
+            removed = db.removed_positions
+            vectors = get_vectors(old)
+        index = build(target, np.delete(vectors, removed, axis=0))
+        with wal.lock:
+            if db.index is not old or db.deletions != deletions:
+                return False  # positions changed meanwhile, start over
+            if old.ntotal > len(vectors):
+                index.add(old.reconstruct_n(len(vectors), old.ntotal - len(vectors)))
+            if len(removed):
+                # the positions after removed ones shift down in the new index
+                dropped = set(removed.tolist())
+                db.index_to_docstore_id = dict(
+                    enumerate(
+                        id for p, id in sorted(db.index_to_docstore_id.items()) if p not in dropped
+                    )
+                )
+                db.removed_positions = np.zeros(0, dtype=np.int64)
+                db.deletions += 1
+            db.index = index
+            db.area_positions = None
+            wal.mark_dirty()  # the next checkpoint writes the new index
+        return True
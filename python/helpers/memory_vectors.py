@@ -0,0 +1,108 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from python.helpers import dotenv
+from python.helpers.memory_index import LOSSY_TYPES, get_configured_type, read_config
+
+# exact float32 vectors of memories with quantized indexes, appended to a file and read
+# through a memory map to re-rank search results, so they do not have to stay in RAM
+VECTORS_FILE = "vectors.f32"
+ROWS_FILE = "vectors.rows"  # document id to row, written with each checkpoint
+
+
+def is_enabled(db_dir: str) -> bool:
+    # index.json of the memory folder, then the environment, only for lossy index types
+    if get_configured_type(db_dir) not in LOSSY_TYPES:
+        return False
+    rerank = read_config(db_dir).get("rerank")
+    if rerank is None:
+        rerank = dotenv.get_dotenv_value("MEMORY_RERANK", "false").lower() == "true"
+    return bool(rerank)
+
+
+def get_rerank_factor() -> int:
+    try:
+        return max(1, int(dotenv.get_dotenv_value("MEMORY_RERANK_FACTOR", 4)))
+    except (TypeError, ValueError):
+        return 4
+
+
+class VectorFile:
+    def __init__(self, db_dir: str, dimensions: int):
+        self.path = os.path.join(db_dir, VECTORS_FILE)
+        self.dimensions = dimensions
+        self.row_size = dimensions * 4
+        self.lock = threading.Lock()
+        self.map: np.ndarray | None = None
+        self.rows: dict[str, int] = {}
+        try:
+            with open(os.path.join(db_dir, ROWS_FILE), "rb") as f:
+                self.rows = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+        # rows appended after the last checkpoint are appended again by the log replay
+        self.count = max(self.rows.values(), default=-1) + 1
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.count * self.row_size:
+            os.truncate(self.path, self.count * self.row_size)
+
+    def append(self, ids: list[str], vectors: list[list[float]]):
+        data = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(data.tobytes())
+            for i, id in enumerate(ids):
+                self.rows[id] = self.count + i
+            self.count += len(ids)
+            self.map = None  # the file grew, map it again on next read
+
+    def remove(self, ids: list[str]):
+        # rows stay in the file until it is rewritten by the migration tool
+        with self.lock:
+            for id in ids:
+                self.rows.pop(id, None)
+
+    def scores(self, ids: list[str], query: list[float]) -> list[float | None]:
+        # inner products with the stored vectors, None for documents without one
+        with self.lock:
+            rows = [self.rows.get(id) for id in ids]
+            found = [r for r in rows if r is not None]
+            if not found:
+                return [None] * len(ids)
+            products = self._map()[found] @ np.asarray(query, dtype=np.float32)
+        it = iter(products.tolist())
+        return [next(it) if r is not None else None for r in rows]
+
+    def get(self, ids: list[str]) -> np.ndarray:
+        # vectors of stored documents, in the order of ids
+        with self.lock:
+            return np.array(self._map()[[self.rows[id] for id in ids]])
+
+    def _map(self) -> np.ndarray:
+        if self.map is None:
+            self.map = np.memmap(
+                self.path, dtype=np.float32, mode="r", shape=(self.count, self.dimensions)
+            )
+        return self.map
+
+    def sync(self):
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                os.fsync(f.fileno())
+
+    def snapshot(self) -> bytes:
+        with self.lock:
+            return pickle.dumps(self.rows)
+
+    def rewrite(self, ids: list[str], vectors: np.ndarray):
+        # a compact file without deleted rows, committed by the next checkpoint
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(np.asarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            self.rows = {id: i for i, id in enumerate(ids)}
+            self.count = len(ids)
+            self.map = None
@@ -0,0 +1,300 @@
+import base64
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Any
+
+import faiss
+import numpy as np
+
+from langchain_core.documents import Document
+
+from python.helpers import dotenv
+from python.helpers.memory_docstore import MemoryDocstore
+from python.helpers.print_style import PrintStyle
+
+# inserts and deletes are appended to numbered log segments, a background checkpoint
+# writes the full index and starts a new segment, loading replays the segments after it
+INDEX_FILES = ("index.faiss", "index.pkl")  # the index and its positions to document ids
+VECTOR_FILES = ("vectors.rows", "vectors.f32")  # exact vectors for re-ranking, when enabled
+CHECKPOINT_FILE = "checkpoint.json"
+PENDING_FILE = "checkpoint.pending"
+SEGMENT_PATTERN = re.compile(r"^wal\.(\d+)\.jsonl$")
+CHECK_INTERVAL = 5  # seconds between checks of the worker
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(dotenv.get_dotenv_value(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_checkpoint_ops() -> int:
+    return _env_int("MEMORY_CHECKPOINT_OPS", 1000)
+
+
+def get_checkpoint_interval() -> int:
+    return _env_int("MEMORY_CHECKPOINT_INTERVAL", 300)
+
+
+class MemoryWal:
+    _instances: dict[str, "MemoryWal"] = {}
+    _instances_lock = threading.Lock()
+
+    @staticmethod
+    def get(db_dir: str) -> "MemoryWal":
+        with MemoryWal._instances_lock:
+            wal = MemoryWal._instances.get(db_dir)
+            if not wal:
+                wal = MemoryWal._instances[db_dir] = MemoryWal(db_dir)
+            return wal
+
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.db: Any = None
+        self.lock = threading.RLock()  # held while the db and the log are changed
+        self.checkpoint_lock = threading.Lock()
+        self.segment = 1
+        self.ops = 0
+        self.dirty_since = 0.0
+        self.wake = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def recover_files(self):
+        # finish or discard a checkpoint interrupted by a crash, before the index is loaded
+        with self.checkpoint_lock:
+            self._finish_checkpoint()
+
+    def attach(self, db) -> int:
+        # replay the log segments over the db loaded from the last checkpoint
+        with self.lock:
+            self.db = db
+            first = self._read_checkpoint()
+            segments = self._segments()
+            pending = 0
+            if isinstance(db.docstore, MemoryDocstore):
+                # documents of a checkpoint interrupted before its database commit
+                committed = db.docstore.get_wal()
+                for no in segments:
+                    if committed <= no < first:
+                        self._replay_documents(no)
+                pending = len(db.docstore.changes)
+            replayed = 0
+            for no in segments:
+                if no >= first:
+                    replayed += self._replay(no)
+            self.segment = max(segments + [first])
+            self.ops = replayed or pending
+            self.dirty_since = time.monotonic()
+            if self.ops:
+                self._start()
+        return replayed
+
+    def log_add(
+        self,
+        ids: list[str],
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict],
+    ):
+        lines = [
+            json.dumps(
+                {
+                    "op": "add",
+                    "id": id,
+                    "text": text,
+                    "metadata": metadata,
+                    "vector": base64.b64encode(
+                        np.asarray(vector, dtype=np.float32).tobytes()
+                    ).decode("ascii"),
+                },
+                ensure_ascii=False,
+                default=str,
+            )
+            for id, text, vector, metadata in zip(ids, texts, embeddings, metadatas)
+        ]
+        self._append(lines, len(lines))
+
+    def log_delete(self, ids: list[str]):
+        self._append([json.dumps({"op": "delete", "ids": ids})], len(ids))
+
+    def mark_dirty(self):
+        # the db changed without a log entry, checkpoint it soon
+        with self.lock:
+            if not self.ops:
+                self.dirty_since = time.monotonic()
+            self.ops += 1
+            self._start()
+        self.wake.set()
+
+    def checkpoint(self):
+        # snapshot under the lock, write outside of it while mutations go to a new segment
+        with self.checkpoint_lock:
+            with self.lock:
+                if not self.ops or self.db is None:
+                    return
+                index = faiss.serialize_index(self.db.index)
+                docstore = self.db.docstore
+                if isinstance(docstore, MemoryDocstore):
+                    docstore.snapshot()  # documents are committed to its database below
+                    ids = pickle.dumps((None, self.db.index_to_docstore_id))
+                else:
+                    ids = pickle.dumps((docstore, self.db.index_to_docstore_id))
+                vector_file = getattr(self.db, "vector_file", None)
+                rows = vector_file.snapshot() if vector_file else None
+                done = self.segment
+                self.segment += 1
+                self.ops = 0
+
+            self._write(INDEX_FILES[0] + ".tmp", index.tobytes())
+            self._write(INDEX_FILES[1] + ".tmp", ids)
+            if vector_file:
+                vector_file.sync()  # rows in the snapshot point into the file
+                self._write(VECTOR_FILES[0] + ".tmp", rows)
+            self._write(PENDING_FILE, json.dumps({"wal": done + 1}).encode("utf-8"))
+            if isinstance(docstore, MemoryDocstore):
+                docstore.commit(done + 1)
+            self._finish_checkpoint()
+            for no in self._segments():
+                if no <= done:
+                    os.remove(self._path(f"wal.{no}.jsonl"))
+
+    def _finish_checkpoint(self):
+        # the pending file is written after the other files, it commits them
+        if not os.path.exists(self._path(PENDING_FILE)):
+            for name in INDEX_FILES + VECTOR_FILES:
+                if os.path.exists(self._path(name + ".tmp")):
+                    os.remove(self._path(name + ".tmp"))
+            return
+        for name in INDEX_FILES + VECTOR_FILES:
+            if os.path.exists(self._path(name + ".tmp")):
+                os.replace(self._path(name + ".tmp"), self._path(name))
+        os.replace(self._path(PENDING_FILE), self._path(CHECKPOINT_FILE))
+
+    def _append(self, lines: list[str], ops: int):
+        with self.lock:
+            os.makedirs(self.db_dir, exist_ok=True)
+            with open(self._path(f"wal.{self.segment}.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+            if not self.ops:
+                self.dirty_since = time.monotonic()
+            self.ops += ops
+            due = self.ops >= get_checkpoint_ops()
+            self._start()
+        if due:
+            self.wake.set()
+
+    def _replay(self, no: int) -> int:
+        count = 0
+        adds: list[dict] = []
+        with open(self._path(f"wal.{no}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn write at the end of the log
+                if entry["op"] == "add":
+                    adds.append(entry)
+                else:
+                    self._replay_adds(adds)
+                    adds = []
+                    self._replay_delete(entry["ids"])
+                count += 1
+        self._replay_adds(adds)
+        return count
+
+    def _replay_adds(self, entries: list[dict]):
+        # entries already in the checkpoint are skipped, replay can repeat
+        known = self.db.docstore._dict
+        entries = [e for e in entries if e["id"] not in known]
+        if not entries:
+            return
+        self.db.add_embeddings(
+            [
+                (
+                    e["text"],
+                    np.frombuffer(base64.b64decode(e["vector"]), dtype=np.float32).tolist(),
+                )
+                for e in entries
+            ],
+            metadatas=[e["metadata"] for e in entries],
+            ids=[e["id"] for e in entries],
+        )
+
+    def _replay_delete(self, ids: list[str]):
+        ids = [id for id in ids if id in self.db.docstore._dict]
+        if ids:
+            self.db.delete(ids=ids)
+
+    def _replay_documents(self, no: int):
+        # documents only, the index files of that checkpoint were committed
+        docs = self.db.docstore._dict
+        with open(self._path(f"wal.{no}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if entry["op"] == "add":
+                    if entry["id"] not in docs:
+                        docs[entry["id"]] = Document(
+                            page_content=entry["text"], metadata=entry["metadata"]
+                        )
+                else:
+                    for id in entry["ids"]:
+                        if id in docs:
+                            del docs[id]
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(self._path(CHECKPOINT_FILE), "r") as f:
+                return json.load(f)["wal"]
+        except (OSError, ValueError, KeyError):
+            return 1
+
+    def _segments(self) -> list[int]:
+        if not os.path.isdir(self.db_dir):
+            return []
+        return sorted(
+            int(m.group(1))
+            for m in map(SEGMENT_PATTERN.match, os.listdir(self.db_dir))
+            if m
+        )
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.db_dir, name)
+
+    def _write(self, name: str, data: bytes):
+        with open(self._path(name), "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(
+            target=self._run, daemon=True, name="MemoryCheckpoint"
+        )
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(CHECK_INTERVAL)
+            self.wake.clear()
+            with self.lock:
+                due = self.ops >= get_checkpoint_ops() or (
+                    self.ops
+                    and time.monotonic() - self.dirty_since >= get_checkpoint_interval()
+                )
+            if due:
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    PrintStyle.error(f"Error writing memory checkpoint in {self.db_dir}: {e}")
@@ -1,55 +1,538 @@
 from collections import OrderedDict
-from typing import Any
+from typing import Any, IO, Iterator
+import atexit
+import threading
+import time
 import uuid
+import weakref
 from agent import Agent, AgentConfig, AgentContext
-from python.helpers import files, history
+from python.helpers import files, history, dotenv, process, chat_storage
 import json
+import os
 from initialize import initialize
 
 from python.helpers.log import Log, LogItem
+from python.helpers.print_style import PrintStyle
 
 CHATS_FOLDER = "tmp/chats"
 LOG_SIZE = 1000
 CHAT_FILE_NAME = "chat.json"
+JOURNAL_FILE_NAME = "journal.jsonl"
+INDEX_FILE_NAME = "index.json"  # metadata of all chats, read at startup instead of the chats
+SNAPSHOT_EVERY = 200  # journal entries before the chat is compacted into a new snapshot
+JOURNAL_MIN_SIZE = 1024 * 1024  # journal may grow up to the snapshot size or this
+
+
+class _AgentMark:
+    # what of an agent has already been written
+    def __init__(self, agent: Agent, version: int, current_len: int, data: str):
+        self.history = weakref.ref(agent.history)
+        self.version = version
+        self.current_len = current_len
+        self.data = data
+
+
+class _Marks:
+    # state of a context captured together with the data written, recorded once it is saved
+    def __init__(
+        self, agents: list[Agent], agent_marks: list[_AgentMark], log_guid: str, log_version: int
+    ):
+        self.agents = agents
+        self.agent_marks = agent_marks
+        self.log_guid = log_guid
+        self.log_version = log_version
+
+
+class _Journal:
+    def __init__(self, context: AgentContext, id: str, snapshot_size: int, marks: _Marks):
+        self.context = weakref.ref(context)
+        self.id = id
+        self.snapshot_size = snapshot_size
+        self.entries = 0
+        self.size = 0
+        self.mark(marks)
+
+    def mark(self, marks: _Marks):
+        self.agents = [weakref.ref(a) for a in marks.agents]
+        self.agent_marks = marks.agent_marks
+        self.log_guid = marks.log_guid
+        self.log_version = marks.log_version
+
+    def is_full(self) -> bool:
+        return (
+            self.entries >= SNAPSHOT_EVERY
+            or self.size > max(self.snapshot_size, JOURNAL_MIN_SIZE)
+        )
+
+
+_journals: dict[str, _Journal] = {}
+_journals_lock = threading.RLock()
+_index: dict[str, dict[str, Any]] | None = None
+_index_dirty = False
+
+
+def get_compression() -> str:
+    return chat_storage.get_compression(
+        dotenv.get_dotenv_value("CHAT_COMPRESSION", "none")
+    )
+
+
+def get_save_delay() -> float:
+    try:
+        return float(dotenv.get_dotenv_value("CHAT_SAVE_DEBOUNCE", 1000)) / 1000
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class _SaveWorker:
+    # saves chats on a background thread, requests within the delay are coalesced into one save
+
+    def __init__(self):
+        self.pending: dict[str, tuple[AgentContext, float]] = {}
+        self.cond = threading.Condition()
+        self.thread: threading.Thread | None = None
+        self.saving = 0
+
+    def request(self, context: AgentContext, delay: float):
+        with self.cond:
+            if context.id not in self.pending:
+                self.pending[context.id] = (context, time.monotonic() + delay)
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, daemon=True, name="ChatSaveWorker"
+                )
+                self.thread.start()
+            self.cond.notify()
+
+    def cancel(self, ctxid: str):
+        with self.cond:
+            self.pending.pop(ctxid, None)
+
+    def take(self, ctxid: str | None = None) -> list[AgentContext]:
+        with self.cond:
+            ids = [ctxid] if ctxid else list(self.pending)
+            return [self.pending.pop(i)[0] for i in ids if i in self.pending]
+
+    def _run(self):
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                due = [i for i, (_, t) in self.pending.items() if t <= now]
+                if not due:
+                    wait = min((t for _, t in self.pending.values()), default=now + 60)
+                    self.cond.wait(max(wait - now, 0.01))
+                    continue
+                contexts = [self.pending.pop(i)[0] for i in due]
+                self.saving += 1
+            try:
+                for context in contexts:
+                    _save_live_chat(context)
+                _write_index()
+            finally:
+                with self.cond:
+                    self.saving -= 1
+                    self.cond.notify_all()
+
+    def wait_idle(self):
+        with self.cond:
+            while self.saving:
+                self.cond.wait()
+
+
+_worker = _SaveWorker()
+
+
+def request_save(context: AgentContext, delay: float | None = None):
+    # save soon on the background worker, repeated requests are coalesced
+    _worker.request(context, get_save_delay() if delay is None else delay)
+
+
+def flush(ctxid: str | None = None):
+    # write pending saves now, returns after all of them (and any save in progress) are done
+    for context in _worker.take(ctxid):
+        _save_live_chat(context)
+    _worker.wait_idle()
+    _write_index()
+
+
+def _save_live_chat(context: AgentContext):
+    # removed contexts are not saved, their folder could have been deleted already
+    if AgentContext._contexts.get(context.id) is not context:
+        return
+    try:
+        save_tmp_chat(context)
+    except Exception as e:
+        PrintStyle.error(f"Error saving chat {context.id}: {e}")
+        request_save(context)  # state may have changed during encoding, try again
+
+
+atexit.register(flush)
+process.on_shutdown(flush)
 
 
 def get_chat_folder_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid)
 
 def save_tmp_chat(context: AgentContext):
-    path = _get_chat_file_path(context.id)
-    files.make_dirs(path)
-    data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    files.write_file(path, js)
+    # append what changed since the last save, compact into a new snapshot from time to time
+    _worker.cancel(context.id)
+    with _journals_lock:
+        journal = _journals.get(context.id)
+        entry, marks = None, None
+        if journal and journal.context() is context and not journal.is_full():
+            entry, marks = _journal_entry(context, journal)
+        if entry is None:
+            _save_snapshot(context)
+        elif entry:
+            line = chat_storage.dumps(entry) + "\n"
+            files.append_file(_get_journal_file_path(context.id), line, sync=True)
+            journal.entries += 1
+            journal.size += len(line)
+            journal.mark(marks)  # type: ignore
+        else:
+            return
+        _update_index(context.id, context.metadata())
+
+
+def _save_snapshot(context: AgentContext):
+    # versions are read before serializing, what changes meanwhile is journaled again
+    agents = context.get_agents()
+    versions = [agent.history.version for agent in agents]
+    with context.log._lock:
+        log_guid, log_version = context.log.guid, context.log.version
+    data = _serialize_context(context, agents)
+
+    agent_marks = []
+    for agent, version, agent_data in zip(agents, versions, data["agents"]):
+        serialized = chat_storage.dumps(agent_data["data"])
+        agent_data["data"] = json.loads(serialized)
+        current_len = len(agent_data["history"]["current"]["messages"])
+        agent_marks.append(_AgentMark(agent, version, current_len, serialized))
+
+    journal_id, size = _write_snapshot(context.id, data)
+    marks = _Marks(agents, agent_marks, log_guid, log_version)
+    _journals[context.id] = _Journal(context, journal_id, size, marks)
+
+
+def _write_snapshot(ctxid: str, data: dict[str, Any]) -> tuple[str, int]:
+    data["version"] = chat_storage.FORMAT_VERSION
+    data["journal"] = journal_id = str(uuid.uuid4())
+    js = chat_storage.dumps(data)
+    compression = get_compression()
+    path = _get_chat_file_path(ctxid, compression)
+    files.write_file_atomic(path, chat_storage.compress(js.encode("utf-8"), compression))
+    for other in _get_chat_file_variants(ctxid):
+        if other != path and os.path.exists(other):
+            os.remove(other)
+    # entries of the previous journal are ignored from now on, even if the truncation fails
+    files.write_file_atomic(_get_journal_file_path(ctxid), "")
+    return journal_id, len(js)
+
+
+def _journal_entry(
+    context: AgentContext, journal: _Journal
+) -> tuple[dict[str, Any] | None, _Marks | None]:
+    # changes since the last save and the marks they bring the journal to,
+    # no entry if they can not be expressed as a delta
+    agents = context.get_agents()
+    if (
+        len(agents) != len(journal.agents)
+        or any(ref() is not agent for ref, agent in zip(journal.agents, agents))
+        or context.log.guid != journal.log_guid
+    ):
+        return None, None
+
+    agent_entries = []
+    agent_marks = []
+    for i, (agent, mark) in enumerate(zip(agents, journal.agent_marks)):
+        agent_entry: dict[str, Any] = {}
+        hist = agent.history
+        # version before the messages, a change in between is written again next time
+        version = hist.version
+        messages = hist.current.messages
+        current_len = len(messages)
+        if mark.history() is not hist or mark.version != version:
+            agent_entry["history"] = history_dict = hist.to_dict()
+            current_len = len(history_dict["current"]["messages"])
+        elif current_len > mark.current_len:
+            agent_entry["append"] = [
+                m.to_dict() for m in messages[mark.current_len : current_len]
+            ]
+        data = chat_storage.dumps(_get_agent_data(agent))
+        if data != mark.data:
+            agent_entry["data"] = json.loads(data)
+        if agent_entry:
+            agent_entry["index"] = i
+            agent_entries.append(agent_entry)
+        agent_marks.append(_AgentMark(agent, version, current_len, data))
+
+    log = context.log
+    with log._lock:
+        if log.guid != journal.log_guid:
+            return None, None
+        log_version = log.version
+        items = [
+            log.logs[no].output()
+            for no in log.changed_since(journal.log_version)
+            if no < len(log.logs)
+        ]
+        progress, progress_no = log.progress, log.progress_no
+    marks = _Marks(agents, agent_marks, journal.log_guid, log_version)
+    if not agent_entries and not items:
+        return {}, marks
+
+    streaming_agent = context.streaming_agent
+    return {
+        "journal": journal.id,
+        "name": context.name,
+        "streaming_agent_index": (
+            agents.index(streaming_agent) if streaming_agent in agents else 0
+        ),
+        "agents": agent_entries,
+        "log": {
+            "items": items,
+            "progress": progress,
+            "progress_no": progress_no,
+        },
+    }, marks
 
 
 def load_tmp_chats():
+    # register persisted chats from the index, they are deserialized on first access
     _convert_v080_chats()
-    folders = files.list_files("tmp/chats/", "*")
-    json_files = []
-    for folder in folders:
-        json_files.append(_get_chat_file_path(folder))
-
-    ctxids = []
-    for file in json_files:
+    folders = [
+        f
+        for f in files.list_files(CHATS_FOLDER, "*")
+        if os.path.isdir(get_chat_folder_path(f))
+    ]
+
+    index = _get_index()
+    entries = []
+    for ctxid in folders:
         try:
-            js = files.read_file(file)
-            data = json.loads(js)
-            ctx = _deserialize_context(data)
-            ctxids.append(ctx.id)
+            entry = index.get(ctxid)
+            if not entry or entry.get("mtime") != _get_chat_mtime(ctxid):
+                migrate_chat(ctxid)
+                entry = _build_index_entry(ctxid)
+                _update_index(ctxid, entry)
+            entries.append(entry)
         except Exception as e:
-            print(f"Error loading chat {file}: {e}")
+            print(f"Error loading chat {ctxid}: {e}")
+
+    with _journals_lock:
+        for ctxid in list(index):
+            if ctxid not in folders:
+                _update_index(ctxid, None)
+    _write_index()
+
+    ctxids = []
+    for entry in sorted(entries, key=lambda e: e.get("last_active", 0)):
+        if entry["id"] in AgentContext._contexts:
+            continue
+        AgentContext._counter += 1
+        metadata = {k: v for k, v in entry.items() if k not in ("size", "mtime")}
+        AgentContext._hibernated[entry["id"]] = {
+            **metadata,
+            "no": AgentContext._counter,
+            "paused": False,
+        }
+        ctxids.append(entry["id"])
     return ctxids
 
 
-def _get_chat_file_path(ctxid: str):
-    return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME)
+def _get_index() -> dict[str, dict[str, Any]]:
+    global _index
+    if _index is None:
+        path = files.get_abs_path(CHATS_FOLDER, INDEX_FILE_NAME)
+        try:
+            _index = json.loads(files.read_file(path)) if files.exists(path) else {}
+        except Exception:
+            _index = {}  # rebuilt from the chats
+    return _index
+
+
+def _update_index(ctxid: str, metadata: dict[str, Any] | None):
+    global _index_dirty
+    with _journals_lock:
+        index = _get_index()
+        if metadata is None:
+            index.pop(ctxid, None)
+        else:
+            index[ctxid] = {
+                "id": ctxid,
+                "name": metadata.get("name"),
+                "last_active": metadata.get("last_active", 0),
+                "log_guid": metadata.get("log_guid", ""),
+                "log_version": metadata.get("log_version", 0),
+                "log_length": metadata.get("log_length", 0),
+                "size": _get_chat_size(ctxid),
+                "mtime": _get_chat_mtime(ctxid),
+            }
+        _index_dirty = True
+
+
+def _write_index():
+    global _index_dirty
+    with _journals_lock:
+        if not _index_dirty:
+            return
+        js = json.dumps(_get_index(), ensure_ascii=False)
+        files.write_file_atomic(files.get_abs_path(CHATS_FOLDER, INDEX_FILE_NAME), js)
+        _index_dirty = False
+
+
+def _build_index_entry(ctxid: str) -> dict[str, Any]:
+    # metadata read from the chat files without building the context
+    data = _read_chat(ctxid)
+    log = data.get("log", {})
+    logs = log.get("logs", [])
+    return {
+        "id": ctxid,
+        "name": data.get("name"),
+        "last_active": _get_chat_mtime(ctxid),
+        "log_guid": log.get("guid", ""),
+        "log_version": len(logs),
+        "log_length": log.get("offset", 0) + len(logs),
+    }
+
+
+def _get_chat_files(ctxid: str) -> list[str]:
+    paths = _get_chat_file_variants(ctxid) + [_get_journal_file_path(ctxid)]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def _get_chat_size(ctxid: str) -> int:
+    return sum(os.path.getsize(p) for p in _get_chat_files(ctxid))
+
+
+def _get_chat_mtime(ctxid: str) -> float:
+    return max((os.path.getmtime(p) for p in _get_chat_files(ctxid)), default=0)
+
+
+def load_tmp_chat(ctxid: str) -> AgentContext | None:
+    if not _find_chat_file(ctxid):
+        return None
+    data = _read_chat(ctxid)
+    return _deserialize_context(data)
+
+
+def migrate_chat(ctxid: str) -> bool:
+    # rewrite a chat stored in an older format or with other compression than configured
+    with _journals_lock:
+        path = _find_chat_file(ctxid)
+        if not path:
+            return False
+        data = _read_chat(ctxid)
+        if not data.pop("_outdated", False) and path == _get_chat_file_path(
+            ctxid, get_compression()
+        ):
+            return False
+        _journals.pop(ctxid, None)
+        _write_snapshot(ctxid, data)
+        return True
+
+
+def _get_chat_file_path(ctxid: str, compression: str = "none"):
+    return files.get_abs_path(
+        CHATS_FOLDER, ctxid, CHAT_FILE_NAME + chat_storage.EXTENSIONS[compression]
+    )
+
+
+def _get_chat_file_variants(ctxid: str) -> list[str]:
+    return [_get_chat_file_path(ctxid, c) for c in chat_storage.EXTENSIONS]
+
+
+def _find_chat_file(ctxid: str) -> str | None:
+    for path in _get_chat_file_variants(ctxid):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _get_journal_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, JOURNAL_FILE_NAME)
+
+
+def _read_chat(ctxid: str) -> dict[str, Any]:
+    # snapshot with journal entries replayed on top
+    path = _find_chat_file(ctxid)
+    if not path:
+        raise FileNotFoundError(f"Chat {ctxid} not found")
+    data = chat_storage.read_file(path)
+    if chat_storage.upgrade(data):
+        data["_outdated"] = True
+    journal_path = _get_journal_file_path(ctxid)
+    if data.get("journal") and files.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            _replay_journal(data, f)
+    return data
+
+
+def _replay_journal(data: dict[str, Any], lines):
+    agents = data.get("agents", [])
+    log = data.setdefault("log", {})
+    logs = log.setdefault("logs", [])
+    offset = log.get("offset", 0)
+    histories: dict[int, dict[str, Any]] = {}
+
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            break  # unfinished write, nothing valid follows
+        if entry.get("journal") != data["journal"]:
+            continue
+
+        for agent_entry in entry.get("agents", []):
+            index = agent_entry["index"]
+            if index >= len(agents):
+                continue
+            if "data" in agent_entry:
+                agents[index]["data"] = agent_entry["data"]
+            if "history" in agent_entry:
+                histories[index] = agent_entry["history"]
+            if "append" in agent_entry:
+                if index not in histories:
+                    histories[index] = _load_history_dict(agents[index].get("history"))
+                histories[index]["current"]["messages"] += agent_entry["append"]
+
+        for item in entry.get("log", {}).get("items", []):
+            pos = item["no"] - offset
+            if 0 <= pos < len(logs):
+                logs[pos] = item
+            elif pos >= len(logs):
+                logs.append(item)
+        for key in ("progress", "progress_no"):
+            if key in entry.get("log", {}):
+                log[key] = entry["log"][key]
+        if entry.get("name"):
+            data["name"] = entry["name"]
+        if "streaming_agent_index" in entry:
+            data["streaming_agent_index"] = entry["streaming_agent_index"]
+
+    for index, hist in histories.items():
+        agents[index]["history"] = hist
+    log["logs"] = logs[-LOG_SIZE:]
+
+
+def _load_history_dict(hist: dict[str, Any] | str | None) -> dict[str, Any]:
+    if isinstance(hist, dict):
+        return hist
+    if hist:
+        return json.loads(hist)
+    return {
+        "_cls": "History",
+        "bulks": [],
+        "topics": [],
+        "current": {"_cls": "Topic", "summary": "", "messages": []},
+    }
 
 
 def _convert_v080_chats():
     json_files = files.list_files("tmp/chats", "*.json")
     for file in json_files:
+        if file == INDEX_FILE_NAME:
+            continue
         path = files.get_abs_path(CHATS_FOLDER, file)
         name = file.rstrip(".json")
         fold = files.get_abs_path(CHATS_FOLDER, name)
@@ -61,49 +544,94 @@ def load_json_chats(jsons: list[str]):
     ctxids = []
     for js in jsons:
         data = json.loads(js)
-        if "id" in data:
-            del data["id"]  # remove id to get new
-        ctx = _deserialize_context(data)
-        ctxids.append(ctx.id)
+        ctxids.append(_import_chat(data))
+    return ctxids
+
+
+def load_chat_files(streams: list[IO[bytes]]):
+    # import exported chats from file streams, plain or compressed
+    ctxids = []
+    for stream in streams:
+        data = chat_storage.load(stream)
+        ctxids.append(_import_chat(data))
     return ctxids
 
 
+def _import_chat(data: dict[str, Any]) -> str:
+    chat_storage.upgrade(data)
+    if "id" in data:
+        del data["id"]  # remove id to get new
+    data.pop("journal", None)
+    ctx = _deserialize_context(data)
+    request_save(ctx, delay=0)
+    return ctx.id
+
+
 def export_json_chat(context: AgentContext):
     data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    return js
+    data["version"] = chat_storage.FORMAT_VERSION
+    return chat_storage.dumps(data)
+
+
+def export_json_chat_stream(context: AgentContext) -> Iterator[str]:
+    data = _serialize_context(context)
+    data["version"] = chat_storage.FORMAT_VERSION
+    return chat_storage.iter_encode(data)
 
 
 def remove_chat(ctxid):
-    files.delete_dir(get_chat_folder_path(ctxid))
+    _worker.cancel(ctxid)
+    with _journals_lock:
+        _journals.pop(ctxid, None)
+        files.delete_dir(get_chat_folder_path(ctxid))
+        _update_index(ctxid, None)
+        _write_index()
 
 
 
-def _serialize_context(context: AgentContext):
-    # serialize agents
+def _serialize_context(context: AgentContext, all_agents: list[Agent] | None = None):
+    # serialize agents as a tree, every agent points to the index of its superior
     agents = []
-    agent = context.agent0
-    while agent:
-        agents.append(_serialize_agent(agent))
-        agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    all_agents = all_agents or context.get_agents()
+    for agent in all_agents:
+        superior = agent.data.get(Agent.DATA_NAME_SUPERIOR, None)
+        if superior in all_agents:
+            fanout = superior.get_data(Agent.DATA_NAME_SUBORDINATES) or []
+            agents.append(
+                _serialize_agent(
+                    agent, superior=all_agents.index(superior), fanout=agent in fanout
+                )
+            )
+        else:
+            agents.append(_serialize_agent(agent))
 
+    streaming_agent = context.streaming_agent
     return {
         "id": context.id,
+        "name": context.name,
         "agents": agents,
-        "streaming_agent": (
-            context.streaming_agent.number if context.streaming_agent else 0
+        "streaming_agent": streaming_agent.number if streaming_agent else 0,
+        "streaming_agent_index": (
+            all_agents.index(streaming_agent) if streaming_agent in all_agents else 0
         ),
         "log": _serialize_log(context.log),
     }
 
 
-def _serialize_agent(agent: Agent):
-    data = {k: v for k, v in agent.data.items() if not k.startswith("_")}
+def _get_agent_data(agent: Agent):
+    return {k: v for k, v in agent.data.items() if not k.startswith("_")}
 
-    history = agent.history.serialize()
+
+def _serialize_agent(agent: Agent, superior: int = -1, fanout: bool = False):
+    data = _get_agent_data(agent)
+
+    history = agent.history.to_dict()
 
     return {
         "number": agent.number,
+        "name": agent.agent_name,
+        "superior": superior,
+        "fanout": fanout,
         "data": data,
         "history": history,
     }
@@ -112,6 +640,7 @@ def _serialize_agent(agent: Agent):
 def _serialize_log(log: Log):
     return {
         "guid": log.guid,
+        "offset": max(len(log.logs) - LOG_SIZE, 0),  # number of the first item kept
         "logs": [
             item.output() for item in log.logs[-LOG_SIZE:]
         ],  # serialize LogItem objects
@@ -135,10 +664,15 @@ def _deserialize_context(data):
     )
 
     agents = data.get("agents", [])
-    agent0 = _deserialize_agents(agents, config, context)
-    streaming_agent = agent0
-    while streaming_agent.number != data.get("streaming_agent", 0):
-        streaming_agent = streaming_agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    all_agents = _deserialize_agents(agents, config, context)
+    agent0 = all_agents[0]
+    if "streaming_agent_index" in data:
+        index = data["streaming_agent_index"]
+        streaming_agent = all_agents[index] if index < len(all_agents) else agent0
+    else:
+        # older chats only have a chain of agents
+        number = data.get("streaming_agent", 0)
+        streaming_agent = next((a for a in all_agents if a.number == number), agent0)
 
     context.agent0 = agent0
     context.streaming_agent = streaming_agent
@@ -148,29 +682,36 @@ def _deserialize_context(data):
 
 def _deserialize_agents(
     agents: list[dict[str, Any]], config: AgentConfig, context: AgentContext
-) -> Agent:
-    prev: Agent | None = None
-    zero: Agent | None = None
+) -> list[Agent]:
+    result: list[Agent] = []
 
-    for ag in agents:
+    for i, ag in enumerate(agents):
         current = Agent(
             number=ag["number"],
             config=config,
             context=context,
         )
         current.data = ag.get("data", {})
+        current.data.pop("ctx_window", None)  # saved by older versions, rebuilt every iteration
         current.history = history.deserialize_history(
             ag.get("history", ""), agent=current
         )
-        if not zero:
-            zero = current
+        if ag.get("name"):
+            current.agent_name = ag["name"]
 
-        if prev:
-            prev.set_data(Agent.DATA_NAME_SUBORDINATE, current)
-            current.set_data(Agent.DATA_NAME_SUPERIOR, prev)
-        prev = current
+        # older chats have no superior index, each agent is subordinate of the previous one
+        superior_index = ag.get("superior", i - 1)
+        if 0 <= superior_index < len(result):
+            superior = result[superior_index]
+            current.set_data(Agent.DATA_NAME_SUPERIOR, superior)
+            if ag.get("fanout", False):
+                fanout = superior.get_data(Agent.DATA_NAME_SUBORDINATES) or []
+                superior.set_data(Agent.DATA_NAME_SUBORDINATES, fanout + [current])
+            else:
+                superior.set_data(Agent.DATA_NAME_SUBORDINATE, current)
+        result.append(current)
 
-    return zero or Agent(0, config, context)
+    return result or [Agent(0, config, context)]
 
 
 # def _deserialize_history(history: list[dict[str, Any]]):
@@ -187,14 +728,13 @@ def _deserialize_agents(
 
 
 def _deserialize_log(data: dict[str, Any]) -> "Log":
+    # a new guid, the version restarts so clients of the saved log need a full resync
     log = Log()
-    log.guid = data.get("guid", str(uuid.uuid4()))
-    log.set_initial_progress()
 
     # Deserialize the list of LogItem objects
     i = 0
     for item_data in data.get("logs", []):
-        log.logs.append(
+        log.add_item(
             LogItem(
                 log=log,  # restore the log reference
                 no=i,  # item_data["no"],
@@ -205,28 +745,6 @@ def _deserialize_log(data: dict[str, Any]) -> "Log":
                 temp=item_data.get("temp", False),
             )
         )
-        log.updates.append(i)
         i += 1
 
     return log
-
-
-def _safe_json_serialize(obj, **kwargs):
-    def serializer(o):
-        if isinstance(o, dict):
-            return {k: v for k, v in o.items() if is_json_serializable(v)}
-        elif isinstance(o, (list, tuple)):
-            return [item for item in o if is_json_serializable(item)]
-        elif is_json_serializable(o):
-            return o
-        else:
-            return None  # Skip this property
-
-    def is_json_serializable(item):
-        try:
-            json.dumps(item)
-            return True
-        except (TypeError, OverflowError):
-            return False
-
-    return json.dumps(obj, default=serializer, **kwargs)
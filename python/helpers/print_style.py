@@ -1,11 +1,18 @@
 import os, webcolors, html
 import sys
+import threading
+import weakref
 from datetime import datetime
 from . import files
+from .coalesce import Coalescer
 
 class PrintStyle:
     last_endline = True
     log_file_path = None
+    # streamed text is written once per window, one coalescer per thread so
+    # concurrent streams don't merge into each other's chunks
+    _local = threading.local()
+    _streams: "weakref.WeakSet[Coalescer]" = weakref.WeakSet()
 
     def __init__(self, bold=False, italic=False, underline=False, font_color="default", background_color="default", padding=False, log_only=False):
         self.bold = bold
@@ -75,6 +82,7 @@ class PrintStyle:
 
     def _add_padding_if_needed(self):
         if self.padding and not self.padding_added:
+            PrintStyle.flush()
             if not self.log_only:
                 print()  # Print an empty line for padding
             self._log_html("<br>")
@@ -84,8 +92,32 @@ class PrintStyle:
         with open(PrintStyle.log_file_path, "a", encoding='utf-8') as f: # type: ignore # add encoding='utf-8'
             f.write(html)
 
+    @staticmethod
+    def _write_stream(console="", html=""):
+        if console:
+            print(console, end='', flush=True)
+        if html:
+            with open(PrintStyle.log_file_path, "a", encoding='utf-8') as f: # type: ignore
+                f.write(html)
+
+    @staticmethod
+    def flush():
+        stream = getattr(PrintStyle._local, "stream", None)
+        if stream:
+            stream.flush()
+
+    @staticmethod
+    def _get_stream() -> Coalescer:
+        stream = getattr(PrintStyle._local, "stream", None)
+        if not stream:
+            stream = PrintStyle._local.stream = Coalescer(PrintStyle._write_stream)
+            PrintStyle._streams.add(stream)
+        return stream
+
     @staticmethod
     def _close_html_log():
+        for stream in list(PrintStyle._streams):
+            stream.flush()
         if PrintStyle.log_file_path:
             with open(PrintStyle.log_file_path, "a") as f:
                 f.write("</pre></body></html>")            
@@ -95,6 +127,7 @@ class PrintStyle:
         return text, self._get_styled_text(text), self._get_html_styled_text(text)
         
     def print(self, *args, sep=' ', **kwargs):
+        PrintStyle.flush()
         self._add_padding_if_needed()
         if not PrintStyle.last_endline: 
             print()
@@ -108,9 +141,9 @@ class PrintStyle:
     def stream(self, *args, sep=' ', **kwargs):
         self._add_padding_if_needed()
         plain_text, styled_text, html_text = self.get(*args, sep=sep, **kwargs)
-        if not self.log_only:
-            print(styled_text, end='', flush=True)
-        self._log_html(html_text)
+        PrintStyle._get_stream().append(
+            console="" if self.log_only else styled_text, html=html_text
+        )
         PrintStyle.last_endline = False
 
     def is_last_line_empty(self):
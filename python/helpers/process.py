@@ -4,6 +4,7 @@ from python.helpers import runtime
 from python.helpers.print_style import PrintStyle
 
 _server = None
+_shutdown_callbacks = []
 
 def set_server(server):
     global _server
@@ -19,8 +20,20 @@ def stop_server():
         _server.shutdown()
         _server = None
 
+def on_shutdown(callback):
+    # called before the process exits or restarts itself
+    _shutdown_callbacks.append(callback)
+
+def run_shutdown_callbacks():
+    for callback in _shutdown_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            PrintStyle.error(f"Error in shutdown callback: {e}")
+
 def reload():
     stop_server()
+    run_shutdown_callbacks()
     if runtime.is_dockerized():
         exit_process()
     else:
@@ -1,4 +1,5 @@
 import asyncio
+import threading
 import time
 from typing import Callable, Awaitable
 
@@ -8,24 +9,25 @@ class RateLimiter:
         self.timeframe = seconds
         self.limits = {key: value if isinstance(value, (int, float)) else 0 for key, value in (limits or {}).items()}
         self.values = {key: [] for key in self.limits.keys()}
-        self._lock = asyncio.Lock()
+        self._lock = threading.Lock()  # shared by agents on different event loops
 
     def add(self, **kwargs: int):
         now = time.time()
-        for key, value in kwargs.items():
-            if not key in self.values:
-                self.values[key] = []
-            self.values[key].append((now, value))
+        with self._lock:
+            for key, value in kwargs.items():
+                if not key in self.values:
+                    self.values[key] = []
+                self.values[key].append((now, value))
 
     async def cleanup(self):
-        async with self._lock:
+        with self._lock:
             now = time.time()
             cutoff = now - self.timeframe
             for key in self.values:
                 self.values[key] = [(t, v) for t, v in self.values[key] if t > cutoff]
 
     async def get_total(self, key: str) -> int:
-        async with self._lock:
+        with self._lock:
             if not key in self.values:
                 return 0
             return sum(value for _, value in self.values[key])
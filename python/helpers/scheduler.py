@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Coroutine
+
+from python.helpers import dotenv, loop_watchdog
+from python.helpers.defer import DeferredTask
+
+THREAD_PREFIX = "AgentContext"
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(dotenv.get_dotenv_value(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class LoopShard:
+    def __init__(self, index: int, max_tasks: int):
+        self.index = index
+        self.thread_name = f"{THREAD_PREFIX}-{index}"
+        self.max_tasks = max_tasks
+        self.contexts: set[str] = set()
+        self.running = 0
+        self.queued = 0
+        self.started = 0
+        self.completed = 0
+        # seconds with at least one task started and not finished, awaiting or not, it does not
+        # tell how busy the loop is, the loop watchdog reports lag for that
+        self.active_time = 0.0
+        self._active_since = 0.0
+        self._created = time.monotonic()
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def load(self) -> int:
+        return self.running + self.queued
+
+    def wrap(
+        self,
+        scheduler: "Scheduler",
+        ctxid: str,
+        func: Callable[..., Coroutine[Any, Any, Any]],
+    ):
+        # run func on this shard, respecting the concurrency cap
+        async def wrapper(*args: Any, **kwargs: Any):
+            loop_watchdog.set_context(ctxid)
+            semaphore = self._get_semaphore()
+            with scheduler.lock:
+                self.queued += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                with scheduler.lock:
+                    self.queued -= 1
+            try:
+                with scheduler.lock:
+                    if self.running == 0:
+                        self._active_since = time.monotonic()
+                    self.running += 1
+                    self.started += 1
+                return await func(*args, **kwargs)
+            finally:
+                with scheduler.lock:
+                    self.running -= 1
+                    self.completed += 1
+                    if self.running == 0:
+                        self.active_time += time.monotonic() - self._active_since
+                semaphore.release()
+
+        return wrapper
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # the semaphore belongs to the shard loop, recreate it if the thread was restarted
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_tasks)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        active = self.active_time + (now - self._active_since if self.running else 0)
+        return {
+            "thread": self.thread_name,
+            "contexts": len(self.contexts),
+            "running": self.running,
+            "queued": self.queued,
+            "max_tasks": self.max_tasks,
+            "started": self.started,
+            "completed": self.completed,
+            "active_share": active / max(now - self._created, 1e-9),
+        }
+
+
+class Scheduler:
+    """Spreads AgentContext tasks over a pool of event loop threads."""
+
+    _instance: "Scheduler | None" = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, threads: int = 0, max_tasks: int = 0):
+        threads = threads or _env_int("AGENT_LOOP_THREADS", min(os.cpu_count() or 1, 8))
+        max_tasks = max_tasks or _env_int("AGENT_LOOP_MAX_TASKS", 16)
+        self.lock = threading.Lock()
+        self.shards = [LoopShard(i, max(max_tasks, 1)) for i in range(max(threads, 1))]
+        self.placement: dict[str, LoopShard] = {}
+
+    @classmethod
+    def get(cls) -> "Scheduler":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def place(self, ctxid: str, replace: bool = False) -> LoopShard:
+        # a context stays on its shard unless replaced, which is done only when it has no running task
+        with self.lock:
+            shard = self.placement.get(ctxid)
+            if shard and not replace:
+                return shard
+            # fewest running and queued tasks, a count, not the CPU time they use
+            best = min(self.shards, key=lambda s: (s.load, len(s.contexts)))
+            if shard:
+                shard.contexts.discard(ctxid)
+            best.contexts.add(ctxid)
+            self.placement[ctxid] = best
+            return best
+
+    def release(self, ctxid: str):
+        with self.lock:
+            shard = self.placement.pop(ctxid, None)
+            if shard:
+                shard.contexts.discard(ctxid)
+
+    def create_task(self, ctxid: str) -> DeferredTask:
+        shard = self.place(ctxid, replace=True)
+        return DeferredTask(thread_name=shard.thread_name)
+
+    def start_task(
+        self,
+        ctxid: str,
+        task: DeferredTask,
+        func: Callable[..., Coroutine[Any, Any, Any]],
+        *args: Any,
+        **kwargs: Any,
+    ):
+        shard = self.place(ctxid)
+        task.start_task(shard.wrap(self, ctxid, func), *args, **kwargs)
+        return task
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self.lock:
+            return [shard.stats() for shard in self.shards]
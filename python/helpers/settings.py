@@ -823,13 +823,14 @@ def _apply_settings():
         from agent import AgentContext
         from initialize import initialize
 
+        # model clients are rebuilt with the new settings on next use
+        models.clear_model_cache()
+
         for ctx in AgentContext._contexts.values():
             ctx.config = initialize()  # reinitialize context config with new settings
             # apply config to agents
-            agent = ctx.agent0
-            while agent:
+            for agent in ctx.get_agents():
                 agent.config = ctx.config
-                agent = agent.get_data(agent.DATA_NAME_SUBORDINATE)
 
         # reload whisper model if necessary
         task = defer.DeferredTask().start_task(
@@ -1,19 +1,119 @@
+from collections import OrderedDict
+import threading
 import tiktoken
 
 APPROX_BUFFER = 1.1
+DEFAULT_ENCODING = "cl100k_base"
+MEMO_SIZE = 4096  # number of memoized token counts
+MEMO_MIN_LENGTH = 64  # shorter texts are cheaper to encode than to memoize
+BATCH_THREADS = 8
 
-def count_tokens(text: str, encoding_name="cl100k_base") -> int:
+_encodings: dict[str, tiktoken.Encoding] = {}
+_model_encodings: dict[str, str] = {}
+_memo: OrderedDict[tuple[str, int, int], int] = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_encoding(encoding_name=DEFAULT_ENCODING) -> tiktoken.Encoding:
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        encoding = _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return encoding
+
+
+def get_encoding_name(model: str = "") -> str:
+    # encoding used by the model family, models unknown to tiktoken fall back to the default
+    if not model:
+        return DEFAULT_ENCODING
+    name = _model_encodings.get(model)
+    if name is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model.split("/")[-1])
+            name = encoding.name
+            _encodings.setdefault(name, encoding)
+        except KeyError:
+            name = DEFAULT_ENCODING
+        _model_encodings[model] = name
+    return name
+
+
+def count_tokens(text: str, encoding_name=DEFAULT_ENCODING) -> int:
         if not text:
             return 0
-    
+
+        # Check memoized count first
+        key = _memo_key(text, encoding_name)
+        if key:
+            with _lock:
+                count = _memo.get(key)
+                if count is not None:
+                    _memo.move_to_end(key)
+                    return count
+
         # Get the encoding
-        encoding = tiktoken.get_encoding(encoding_name)
+        encoding = get_encoding(encoding_name)
 
         # Encode the text and count the tokens
-        tokens = encoding.encode(text)
+        tokens = encoding.encode(text, disallowed_special=())
         token_count = len(tokens)
 
+        if key:
+            _memoize(key, token_count)
         return token_count
 
-def approximate_tokens(text: str, ) -> int:
-    return int(count_tokens(text) * APPROX_BUFFER)
\ No newline at end of file
+
+def count_tokens_batch(texts: list[str], encoding_name=DEFAULT_ENCODING) -> list[int]:
+    counts = [0] * len(texts)
+    pending: list[int] = []
+
+    # Use memoized counts where possible
+    with _lock:
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            key = _memo_key(text, encoding_name)
+            count = _memo.get(key) if key else None
+            if count is None:
+                pending.append(i)
+            else:
+                _memo.move_to_end(key)  # type: ignore
+                counts[i] = count
+
+    # Encode the rest in parallel
+    if pending:
+        encoding = get_encoding(encoding_name)
+        encoded = encoding.encode_batch(
+            [texts[i] for i in pending],
+            num_threads=BATCH_THREADS,
+            disallowed_special=(),
+        )
+        for i, tokens in zip(pending, encoded):
+            counts[i] = len(tokens)
+            key = _memo_key(texts[i], encoding_name)
+            if key:
+                _memoize(key, counts[i])
+
+    return counts
+
+
+def approximate_tokens(text: str, model: str = "") -> int:
+    return int(count_tokens(text, get_encoding_name(model)) * APPROX_BUFFER)
+
+
+def approximate_tokens_batch(texts: list[str], model: str = "") -> list[int]:
+    counts = count_tokens_batch(texts, get_encoding_name(model))
+    return [int(count * APPROX_BUFFER) for count in counts]
+
+
+def _memo_key(text: str, encoding_name: str) -> tuple[str, int, int] | None:
+    if len(text) < MEMO_MIN_LENGTH:
+        return None
+    return (encoding_name, len(text), hash(text))
+
+
+def _memoize(key: tuple[str, int, int], count: int):
+    with _lock:
+        _memo[key] = count
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
@@ -11,6 +11,9 @@ class Response:
     
 class Tool:
 
+    # tool has no side effects and can run concurrently with other parallel tools
+    parallel: bool = False
+
     def __init__(self, agent: Agent, name: str, args: dict[str,str], message: str, **kwargs) -> None:
         self.agent = agent
         self.name = name
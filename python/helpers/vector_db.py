@@ -106,9 +106,14 @@ def cosine_normalizer(val: float) -> float:
 
 
 def get_comparator(condition: str):
+    try:
+        code = compile(condition, "<filter>", "eval")  # parsed once, not per document
+    except SyntaxError:
+        code = compile("False", "<filter>", "eval")
+
     def comparator(data: dict[str, Any]):
         try:
-            return eval(condition, {}, data)
+            return eval(code, {}, data)
         except Exception as e:
             # PrintStyle.error(f"Error evaluating condition: {e}")
             return False
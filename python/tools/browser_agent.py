@@ -167,7 +167,8 @@ class BrowserAgent(Tool):
         # wait for browser agent to finish and update progress
         while not task.is_ready():
             await self.agent.handle_intervention()
-            await asyncio.sleep(1)
+            # wake up on pause or intervention, refresh progress at least every second
+            await self.agent.context.wait_for_signal(timeout=1)
             try:
                 update = await self.get_update()
                 log = update.get("log")
@@ -1,10 +1,16 @@
+import asyncio
 from agent import Agent, UserMessage
+from python.helpers import errors
 from python.helpers.tool import Tool, Response
 
 
 class Delegation(Tool):
 
-    async def execute(self, message="", reset="", **kwargs):
+    async def execute(self, message="", reset="", messages=None, **kwargs):
+        # fan-out, run a new subordinate for every message concurrently
+        if isinstance(messages, list) and messages:
+            return await self.fan_out([str(m) for m in messages])
+
         # create subordinate agent using the data object on this agent and set superior agent to his data object
         if (
             self.agent.get_data(Agent.DATA_NAME_SUBORDINATE) is None
@@ -23,3 +29,41 @@ class Delegation(Tool):
         result = await subordinate.monologue()
         # result
         return Response(message=result, break_loop=False)
+
+    async def fan_out(self, messages: list[str]):
+        # every subordinate gets its own history, they all report back to this agent
+        subordinates: list[Agent] = []
+        for i, message in enumerate(messages):
+            sub = Agent(self.agent.number + 1, self.agent.config, self.agent.context)
+            sub.agent_name += f".{i + 1}"
+            sub.set_data(Agent.DATA_NAME_SUPERIOR, self.agent)
+            await sub.hist_add_user_message(UserMessage(message=message, attachments=[]))
+            subordinates.append(sub)
+        self.agent.set_data(Agent.DATA_NAME_SUBORDINATES, subordinates)
+
+        # run subordinate monologues concurrently, a failing one does not stop the others
+        self.agent.set_data(Agent.DATA_NAME_FAN_OUT, subordinates)
+        try:
+            results = await asyncio.gather(
+                *[sub.monologue() for sub in subordinates], return_exceptions=True
+            )
+        finally:
+            self.agent.data.pop(Agent.DATA_NAME_FAN_OUT, None)
+        for res in results:
+            if isinstance(res, BaseException) and not isinstance(res, Exception):
+                raise res  # cancellation
+
+        # all results together, errors reported for the subordinate they happened in
+        result = "\n\n".join(
+            self.agent.read_prompt(
+                "fw.msg_from_subordinate.md",
+                name=sub.agent_name,
+                message=(
+                    self.agent.read_prompt("fw.error.md", error=errors.error_text(res))
+                    if isinstance(res, Exception)
+                    else res
+                ),
+            )
+            for sub, res in zip(subordinates, results)
+        )
+        return Response(message=result, break_loop=False)
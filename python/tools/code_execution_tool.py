@@ -174,7 +174,7 @@ class CodeExecution(Tool):
 
             if partial_output:
                 PrintStyle(font_color="#85C1E9").stream(partial_output)
-                self.log.update(content=full_output)
+                self.log.update(content=full_output)  # the poll already paces updates
                 idle = 0
             else:
                 idle += 1
@@ -8,6 +8,9 @@ from python.helpers.searxng import search as searxng
 
 SEARCH_ENGINE_RESULTS = 10
 class Knowledge(Tool):
+
+    parallel = True
+
     async def execute(self, question="", **kwargs):
         # Create tasks for all three search methods
         tasks = [
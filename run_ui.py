@@ -5,7 +5,7 @@ from flask import Flask, request, Response
 from flask_basicauth import BasicAuth
 from python.helpers import errors, files, git
 from python.helpers.files import get_abs_path
-from python.helpers import persist_chat, runtime, dotenv, process
+from python.helpers import persist_chat, hibernation, runtime, dotenv, process
 from python.helpers.cloudflare_tunnel import CloudflareTunnel
 from python.helpers.extract_tools import load_classes_from_folder
 from python.helpers.api import ApiHandler
@@ -98,8 +98,10 @@ def run():
                 PrintStyle().error(f"Failed to start Cloudflare tunnel: {e}")
                 PrintStyle().print("Continuing without tunnel...")
 
-        # initialize contexts from persisted chats
+        # register persisted chats, they are loaded on first access
         persist_chat.load_tmp_chats()
+        # hibernate idle chats in background
+        hibernation.start()
 
     except Exception as e:
         PrintStyle().error(errors.format_error(e))
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from python.helpers import files  # noqa: E402
+
+
+@pytest.fixture
+def base_dir(tmp_path, monkeypatch):
+    # chats and settings go to a temporary folder, prompts and extensions come from the repository
+    for name in ("prompts", "python", "instruments", "knowledge", "webui"):
+        os.symlink(os.path.join(ROOT, name), tmp_path / name)
+    monkeypatch.setattr(files, "get_base_dir", lambda: str(tmp_path))
+
+    from agent import AgentContext
+    from python.helpers import persist_chat
+
+    monkeypatch.setattr(AgentContext, "_contexts", {})
+    monkeypatch.setattr(AgentContext, "_hibernated", {})
+    monkeypatch.setattr(persist_chat, "_journals", {})
+    monkeypatch.setattr(persist_chat, "_index", None)
+    monkeypatch.setattr(persist_chat, "_index_dirty", False)
+    return tmp_path
@@ -0,0 +1,37 @@
+import asyncio
+
+from agent import Agent, AgentContext, HandledException, UserMessage
+from initialize import initialize
+from python.tools.call_subordinate import Delegation
+
+
+class _Running:
+    def is_alive(self):
+        return True
+
+
+def test_fan_out_keeps_results_and_routes_interventions(base_dir, monkeypatch):
+    context = AgentContext(config=initialize())
+    agent = context.agent0
+    context.streaming_agent = agent
+    context.task = _Running()  # type: ignore
+    received = {}
+
+    async def monologue(self: Agent):
+        assert self.in_fan_out()
+        if self.agent_name.endswith(".1"):
+            context.communicate(UserMessage(message="stop", attachments=[]))
+            raise HandledException(ValueError("boom"))
+        await asyncio.sleep(0.05)
+        received[self.agent_name] = self.intervention
+        return "done"
+
+    monkeypatch.setattr(Agent, "monologue", monologue)
+    tool = Delegation(agent=agent, name="call_subordinate", args={}, message="")
+    response = asyncio.run(tool.fan_out(["first", "second"]))
+
+    assert "boom" in response.message and "done" in response.message
+    assert context.streaming_agent is agent
+    assert list(received.values())[0].message == "stop"
+    assert agent.intervention is None  # handled by the subordinates, not by the superior
+    assert not agent.get_data(Agent.DATA_NAME_FAN_OUT)
@@ -0,0 +1,43 @@
+import asyncio
+
+from agent import AgentContext
+from initialize import initialize
+from python.helpers import hibernation, persist_chat
+
+
+def test_rehydrated_chat_listed_once(base_dir):
+    context = AgentContext(config=initialize())
+    assert hibernation.hibernate(context)
+    assert [m["id"] for m in AgentContext.all_metadata()] == [context.id]
+
+    assert AgentContext.get(context.id) is not None
+    assert [m["id"] for m in AgentContext.all_metadata()] == [context.id]
+
+
+async def _work():
+    await asyncio.sleep(0.3)
+
+
+def test_task_started_while_saving_keeps_context(base_dir, monkeypatch):
+    context = AgentContext(config=initialize())
+    save_tmp_chat = persist_chat.save_tmp_chat
+
+    def save_and_start(ctx):
+        save_tmp_chat(ctx)
+        ctx.run_task(_work)  # a request arriving during the save
+
+    monkeypatch.setattr(persist_chat, "save_tmp_chat", save_and_start)
+    assert not hibernation.hibernate(context)
+    assert AgentContext._contexts.get(context.id) is context
+    assert context.is_running()
+    context.task.result_sync(5)  # type: ignore
+
+
+def test_task_on_hibernated_handle_registers_it_again(base_dir):
+    context = AgentContext(config=initialize())
+    assert hibernation.hibernate(context)
+
+    context.run_task(_work)  # a request that looked the context up before
+    assert AgentContext._contexts.get(context.id) is context
+    assert [m["id"] for m in AgentContext.all_metadata()] == [context.id]
+    context.task.result_sync(5)  # type: ignore
@@ -0,0 +1,32 @@
+from agent import AgentContext
+from initialize import initialize
+from python.helpers import tokens
+
+
+class _CharEncoding:
+    # one token per character, unlike any real tokenizer
+    name = "test_chars"
+
+    def encode(self, text, **kwargs):
+        return list(text)
+
+    def encode_batch(self, texts, **kwargs):
+        return [list(t) for t in texts]
+
+
+def test_history_counted_with_chat_model_tokenizer(base_dir, monkeypatch):
+    monkeypatch.setitem(tokens._encodings, "test_chars", _CharEncoding())
+    monkeypatch.setitem(tokens._model_encodings, "test-model", "test_chars")
+    context = AgentContext(config=initialize())
+    agent = context.agent0
+    agent.config.chat_model.name = "test-model"
+    for i in range(3):
+        agent.hist_add_message(False, f"message {i} " * 20)
+
+    messages = agent.history.current.messages
+    expected = [int(len(m.output_text()) * tokens.APPROX_BUFFER) for m in messages]
+    assert agent.history.current.get_tokens() == sum(expected)
+    # memoized under the model's encoding, not shared with the default one
+    key = tokens._memo_key(messages[0].output_text(), "test_chars")
+    assert key in tokens._memo
+    assert tokens._memo_key(messages[0].output_text(), tokens.DEFAULT_ENCODING) not in tokens._memo
@@ -0,0 +1,52 @@
+from python.helpers.log import Log
+
+
+def _apply(item: dict, delta: dict) -> dict:
+    # what applyLogDelta in webui/index.js does
+    for name in ("heading", "content"):
+        if name in delta:
+            item[name] = delta[name]
+        if name + "_append" in delta:
+            item[name] += delta[name + "_append"]
+    if "kvps" in delta:
+        item["kvps"] = dict(delta["kvps"])
+    if "kvps_set" in delta:
+        item["kvps"] = {**(item.get("kvps") or {}), **delta["kvps_set"]}
+    for key, value in delta.get("kvps_append", {}).items():
+        item["kvps"][key] = item["kvps"].get(key, "") + value
+    return item
+
+
+def test_streamed_kvps_sent_as_deltas():
+    log = Log()
+    item = log.log(type="agent", heading="Generating")
+    client = dict(item.output())
+    version = log.version
+    stream = ""
+    for word in ["I ", "should ", "run ", "code"]:
+        stream += word
+        item.update(content=stream, kvps={"tool_name": "code", "thoughts": stream})
+        (delta,) = log.output_delta(version)
+        version = log.version
+        assert "kvps" not in delta
+        client = _apply(client, delta)
+        assert client["kvps"] == item.kvps
+    assert delta["kvps_append"] == {"thoughts": "code"}
+    assert "kvps_set" not in delta
+
+
+def test_removed_kvps_key_sends_all_kvps():
+    log = Log()
+    item = log.log(type="agent", heading="Generating", kvps={"a": "1", "b": "2"})
+    client = dict(item.output())
+    version = log.version
+
+    item.update(kvps={"a": "1", "c": [3]})
+    (delta,) = log.output_delta(version)
+    assert delta["kvps"] == {"a": "1", "c": [3]}
+    version = log.version
+
+    item.update(kvps={"a": "1", "c": [3, 4]})
+    (delta,) = log.output_delta(version)
+    assert delta["kvps_set"] == {"c": [3, 4]} and "kvps" not in delta
+    assert _apply(client, log.output_delta(0)[0])["kvps"] == item.kvps
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from agent import AgentContext
+from initialize import initialize
+from python.helpers import loop_watchdog
+from python.helpers.defer import EventLoopThread
+from python.helpers.loop_watchdog import LoopWatchdog
+
+
+def _watchdog(name: str) -> LoopWatchdog:
+    watchdog = LoopWatchdog(EventLoopThread(name), threshold=0.2)
+    watchdog.start()
+    time.sleep(0.2)  # task factory installed and heartbeat running
+    return watchdog
+
+
+def test_blocking_child_task_reported_to_its_context(base_dir):
+    context = AgentContext(config=initialize())
+    watchdog = _watchdog("test-watchdog-context")
+
+    async def run():
+        loop_watchdog.set_context(context.id)
+
+        async def block():
+            time.sleep(0.6)
+
+        await asyncio.create_task(block())
+
+    watchdog.loop_thread.run_coroutine(run()).result(5)
+    time.sleep(0.3)
+    assert watchdog.lag_count >= 1
+    assert any(
+        item.type == "warning" and "blocked" in item.heading for item in context.log.logs
+    )
+
+
+def test_stale_pending_capture_dropped(monkeypatch):
+    monkeypatch.setattr(loop_watchdog, "PENDING_TIMEOUT", 0.3)
+    watchdog = _watchdog("test-watchdog-pending")
+    offender = loop_watchdog.Offender("somewhere", [])
+    watchdog._pending = (offender, None, time.monotonic())  # heartbeat never reports it
+    time.sleep(0.6)
+    assert watchdog._pending is None
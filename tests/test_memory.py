@@ -0,0 +1,128 @@
+import asyncio
+import os
+import pickle
+
+import faiss
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from python.helpers import memory_index
+from python.helpers.memory import Memory, MyFaiss
+from python.helpers.memory_docstore import MemoryDocstore
+from python.helpers.memory_wal import INDEX_FILES, PENDING_FILE, MemoryWal
+
+COUNT = 10000  # enough to train every index type
+DIMENSIONS = 16
+
+
+class _Fixed(Embeddings):
+    def __init__(self, vector):
+        self.vector = vector
+
+    def embed_documents(self, texts):
+        return [self.vector for _ in texts]
+
+    def embed_query(self, text):
+        return self.vector
+
+
+def _memory(base_dir, type: str, count: int = COUNT) -> Memory:
+    # documents "0" to count - 1, every tenth in the solutions area, searched for "0"
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docstore = MemoryDocstore(str(base_dir / "memory" / "default"))
+    ids = [str(i) for i in range(count)]
+    areas = ["solutions" if i % 10 == 0 else "main" for i in range(count)]
+    docstore.add(
+        {id: Document(id, metadata={"id": id, "area": area}) for id, area in zip(ids, areas)}
+    )
+    db = MyFaiss(
+        embedding_function=_Fixed(vectors[0].tolist()),
+        index=memory_index.build(type, vectors),
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids)),
+        distance_strategy=DistanceStrategy.COSINE,
+    )
+    assert memory_index.get_index_type(db.index) == type
+    return Memory(agent=None, db=db, memory_subdir="default")  # type: ignore
+
+
+@pytest.mark.parametrize("type", memory_index.TYPES[1:])
+def test_area_search_on_every_index_type(base_dir, type):
+    memory = _memory(base_dir, type)
+
+    found = asyncio.run(memory._search_areas("query", 5, 0.0, {"solutions"}))
+
+    assert len(found) == 5
+    assert {doc.metadata["area"] for doc in found} == {"solutions"}
+    assert found[0].metadata["id"] == "0"  # the query vector itself
+
+
+def test_hnsw_delete_skips_removed_until_rebuild(base_dir):
+    memory = _memory(base_dir, "hnsw", 500)
+    db = memory.db
+    index = db.index
+
+    db.delete(ids=["0", "10"])
+
+    # the graph is kept, searches skip the removed positions
+    assert db.index is index and index.ntotal == 500
+    assert db.removed_positions.tolist() == [0, 10]
+    found = asyncio.run(memory._search_areas("query", 3, 0.0, {"solutions"}))
+    assert not {"0", "10"} & {doc.metadata["id"] for doc in found}
+    found = db.similarity_search_with_score_by_vector(db.embedding_function.embed_query(""), 50)
+    assert len(found) == 50 and not {"0", "10"} & {doc.metadata["id"] for doc, _ in found}
+
+    # a checkpoint keeps them removed
+    wal = MemoryWal(str(base_dir / "memory" / "default"))
+    wal.attach(db)
+    wal.checkpoint()
+    loaded = MyFaiss.load_folder(wal.db_dir, db.embedding_function)
+    assert loaded.removed_positions.tolist() == [0, 10]
+
+    assert memory_index.Upgrader._upgrade(db, wal, "hnsw")
+
+    assert db.index.ntotal == 498 and not len(db.removed_positions)
+    assert db.index_to_docstore_id[0] == "1" and db.index_to_docstore_id[9] == "11"
+    again = db.similarity_search_with_score_by_vector(db.embedding_function.embed_query(""), 50)
+    assert [doc.metadata["id"] for doc, _ in again] == [doc.metadata["id"] for doc, _ in found]
+
+
+def test_pickled_docs_survive_crash_before_docstore_commit(base_dir, monkeypatch):
+    # a folder of an older version, documents pickled next to the index
+    db_dir = str(base_dir / "memory" / "legacy")
+    os.makedirs(db_dir)
+    vectors = np.eye(4, DIMENSIONS, dtype=np.float32)
+    faiss.write_index(
+        memory_index.build("flat", vectors), os.path.join(db_dir, INDEX_FILES[0])
+    )
+    docs = InMemoryDocstore({str(i): Document(str(i), metadata={"id": str(i)}) for i in range(4)})
+    with open(os.path.join(db_dir, INDEX_FILES[1]), "wb") as f:
+        pickle.dump((docs, {i: str(i) for i in range(4)}), f)
+
+    wal = MemoryWal(db_dir)
+    db = MyFaiss.load_folder(db_dir, _Fixed(vectors[0].tolist()))
+    assert db.migrated
+    wal.attach(db)
+    wal.mark_dirty()
+
+    # crash after the pending file is written, before the documents are committed
+    def crash(wal: int):
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr(db.docstore, "commit", crash)
+    with pytest.raises(RuntimeError):
+        wal.checkpoint()
+    assert os.path.exists(os.path.join(db_dir, PENDING_FILE))
+
+    wal = MemoryWal(db_dir)
+    wal.recover_files()
+    db = MyFaiss.load_folder(db_dir, _Fixed(vectors[0].tolist()))
+    wal.attach(db)
+    assert not db.migrated
+    assert sorted(db.docstore._dict.get_many([str(i) for i in range(4)])) == ["0", "1", "2", "3"]
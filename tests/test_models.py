@@ -0,0 +1,25 @@
+import asyncio
+import gc
+
+import models
+from models import ModelProvider, ModelType
+
+
+async def _get_model():
+    return models.get_model(ModelType.CHAT, ModelProvider.OPENAI, "gpt-4o-mini", api_key="test")
+
+
+def test_models_cached_per_loop(monkeypatch):
+    monkeypatch.setattr(models, "model_cache", type(models.model_cache)())
+
+    loop = asyncio.new_event_loop()
+    first = loop.run_until_complete(_get_model())
+    assert loop.run_until_complete(_get_model()) is first
+    loop.close()
+
+    # a new loop never gets the clients of a closed one, even with the same id
+    for _ in range(3):
+        assert asyncio.run(_get_model()) is not first
+    del loop
+    gc.collect()
+    assert len(models.model_cache) <= 1
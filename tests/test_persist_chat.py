@@ -0,0 +1,81 @@
+from agent import AgentContext
+from initialize import initialize
+from python.helpers import files, persist_chat
+
+
+def _restart(context: AgentContext):
+    # forget the live context as if the framework was restarted
+    AgentContext._contexts.pop(context.id)
+    persist_chat._journals.clear()
+    persist_chat._index = None
+
+
+def test_loaded_chat_listed_once(base_dir):
+    context = AgentContext(config=initialize())
+    persist_chat.save_tmp_chat(context)
+    _restart(context)
+
+    assert persist_chat.load_tmp_chats() == [context.id]
+    assert [m["id"] for m in AgentContext.all_metadata()] == [context.id]
+
+    assert AgentContext.get(context.id) is not None
+    assert [m["id"] for m in AgentContext.all_metadata()] == [context.id]
+
+
+def test_changes_during_save_are_saved_next_time(base_dir, monkeypatch):
+    context = AgentContext(config=initialize())
+    agent = context.agent0
+    item = context.log.log(type="info", content="first")
+    persist_chat.save_tmp_chat(context)
+
+    agent.hist_add_message(False, "before")
+    append_file = files.append_file
+
+    def append_and_change(*args, **kwargs):
+        # the context changes after the entry is built, before the journal is marked
+        append_file(*args, **kwargs)
+        agent.hist_add_message(True, "during")
+        item.update(content="changed")
+        agent.data["note"] = "during"
+
+    monkeypatch.setattr(files, "append_file", append_and_change)
+    persist_chat.save_tmp_chat(context)
+    monkeypatch.setattr(files, "append_file", append_file)
+    persist_chat.save_tmp_chat(context)
+
+    data = persist_chat._read_chat(context.id)
+    history = persist_chat._load_history_dict(data["agents"][0]["history"])
+    assert [m["content"] for m in history["current"]["messages"]] == ["before", "during"]
+    assert data["agents"][0]["data"]["note"] == "during"
+    assert data["log"]["logs"][item.no]["content"] == "changed"
+
+
+def test_loaded_log_resyncs_clients(base_dir):
+    context = AgentContext(config=initialize())
+    for i in range(3):
+        context.log.log(type="info", content=str(i))
+    persist_chat.save_tmp_chat(context)
+    guid, version = context.log.guid, context.log.version
+    _restart(context)
+
+    log = persist_chat.load_tmp_chat(context.id).log
+    assert log.guid != guid
+    items, _ = log.output_for(version, guid)
+    assert [i["content"] for i in items] == ["0", "1", "2"]
+
+
+def test_journal_does_not_repeat_context_window(base_dir):
+    context = AgentContext(config=initialize())
+    agent = context.agent0
+    persist_chat.save_tmp_chat(context)
+    journal = persist_chat._get_journal_file_path(context.id)
+
+    prompt = "system prompt and history " * 2000
+    for i in range(5):
+        # what every iteration of the message loop stores
+        agent.set_data(agent.DATA_NAME_CTX_WINDOW, f"{prompt} {i}")
+        agent.hist_add_message(True, f"step {i}")
+        persist_chat.save_tmp_chat(context)
+
+    with open(journal, encoding="utf-8") as f:
+        assert len(f.read()) < len(prompt)
@@ -0,0 +1,29 @@
+import threading
+
+from python.helpers.print_style import PrintStyle
+
+
+def test_stream_coalescer_per_thread(base_dir, monkeypatch):
+    writes = []
+    monkeypatch.setattr(
+        PrintStyle, "_write_stream", staticmethod(lambda console="", html="": writes.append(html))
+    )
+    barrier = threading.Barrier(2)
+
+    def stream(text):
+        barrier.wait()
+        for _ in range(20):
+            PrintStyle(log_only=True).stream(text)
+        PrintStyle.flush()
+
+    threads = [threading.Thread(target=stream, args=(t,)) for t in "①②"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # each write holds the text of one thread only
+    assert writes
+    assert all(("①" in html) != ("②" in html) for html in writes)
+    assert sum(html.count("①") for html in writes) == 20
+    assert sum(html.count("②") for html in writes) == 20
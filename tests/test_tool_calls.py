@@ -0,0 +1,56 @@
+import asyncio
+
+from agent import AgentContext
+from initialize import initialize
+from python.helpers import extract_tools
+from python.helpers.tool import Response, Tool
+
+COMPACT = (
+    '{"tool_calls":[{"tool_name":"a","tool_args":{"query":"q"}},'
+    '{"tool_name":"b","tool_args":{"path":{"dir":"x"}}}]}'
+)
+
+
+class _Recorder(Tool):
+    parallel = True
+    calls: list = []
+
+    async def execute(self, **kwargs):
+        _Recorder.calls.append((self.name, self.args))
+        return Response(message="done", break_loop=False)
+
+
+def _agent(monkeypatch):
+    agent = AgentContext(config=initialize()).agent0
+    _Recorder.calls = []
+    monkeypatch.setattr(
+        agent,
+        "get_tool",
+        lambda name, args, msg, **kwargs: _Recorder(agent=agent, name=name, args=args, message=msg),
+    )
+    return agent
+
+
+def test_compact_nested_json_parsed():
+    data = extract_tools.json_parse_dirty(COMPACT)
+    assert data == {
+        "tool_calls": [
+            {"tool_name": "a", "tool_args": {"query": "q"}},
+            {"tool_name": "b", "tool_args": {"path": {"dir": "x"}}},
+        ]
+    }
+
+
+def test_compact_tool_calls_all_run(base_dir, monkeypatch):
+    agent = _agent(monkeypatch)
+    asyncio.run(agent.process_tools(COMPACT))
+    assert sorted(_Recorder.calls) == [("a", {"query": "q"}), ("b", {"path": {"dir": "x"}})]
+
+
+def test_malformed_tool_call_asked_again(base_dir, monkeypatch):
+    agent = _agent(monkeypatch)
+    asyncio.run(
+        agent.process_tools('{"tool_calls":[{"tool_name":"a","tool_args":{} },{"tool_args":{} }]}')
+    )
+    assert _Recorder.calls == []
+    assert agent.history.current.messages  # misformat warning for the model
@@ -335,28 +335,70 @@ function setConnectionStatus(connected) {
 let lastLogVersion = 0;
 let lastLogGuid = "";
 let lastSpokenNo = 0;
+let logItems = {}; // full log items by no, polls only send what changed
+
+function applyLogDelta(log) {
+    // merge a delta from the server into the known item
+    const item = logItems[log.no] || { heading: "", content: "", kvps: null };
+    item.no = log.no;
+    item.id = log.id;
+    item.type = log.type;
+    item.temp = log.temp;
+    if ("heading" in log) item.heading = log.heading;
+    if ("heading_append" in log) item.heading += log.heading_append;
+    if ("content" in log) item.content = log.content;
+    if ("content_append" in log) item.content += log.content_append;
+    if ("kvps" in log) item.kvps = log.kvps;
+    if (log.kvps_set) item.kvps = Object.assign(item.kvps || {}, log.kvps_set);
+    if (log.kvps_append) {
+        item.kvps = item.kvps || {};
+        for (const [key, value] of Object.entries(log.kvps_append)) {
+            item.kvps[key] = (item.kvps[key] || "") + value;
+        }
+    }
+    logItems[log.no] = item;
+    return item;
+}
 
 async function poll() {
-    let updated = false;
     try {
-        const response = await sendJsonData("/poll", { log_from: lastLogVersion, context });
+        const logFrom = lastLogVersion;
+        const response = await sendJsonData("/poll", {
+            log_from: logFrom,
+            log_guid: lastLogGuid,
+            log_delta: true,
+            context
+        });
         //console.log(response)
+        if (logFrom != lastLogVersion) return false; // the stream delivered these changes meanwhile
+        return applyUpdate(response);
+    } catch (error) {
+        console.error('Error:', error);
+        setConnectionStatus(false);
+    }
+    return false;
+}
 
+function applyUpdate(response) {
+    let updated = false;
+    try {
         if (!context) setContext(response.context);
-        if (response.context != context) return; //skip late polls after context change
+        if (response.context != context) return false; //skip late updates after context change
 
         if (lastLogGuid != response.log_guid) {
             chatHistory.innerHTML = "";
             lastLogVersion = 0;
+            logItems = {};
         }
 
         if (lastLogVersion != response.log_version) {
             updated = true;
-            for (const log of response.logs) {
+            const logs = response.logs.map(applyLogDelta);
+            for (const log of logs) {
                 const messageId = log.id || log.no; // Use log.id if available
                 setMessage(messageId, log.type, log.heading, log.content, log.temp, log.kvps);
             }
-            afterMessagesUpdate(response.logs);
+            afterMessagesUpdate(logs);
         }
 
         updateProgress(response.log_progress);
@@ -368,8 +410,10 @@ async function poll() {
         // Update status icon state
         setConnectionStatus(true);
 
-        const chatsAD = Alpine.$data(chatsSection);
-        chatsAD.contexts = response.contexts;
+        if (response.contexts) { // the stream only sends the list when it changed
+            const chatsAD = Alpine.$data(chatsSection);
+            chatsAD.contexts = response.contexts;
+        }
 
         lastLogVersion = response.log_version;
         lastLogGuid = response.log_guid;
@@ -486,6 +530,8 @@ export const setContext = function (id) {
     lastLogGuid = "";
     lastLogVersion = 0;
     lastSpokenNo = 0;
+    logItems = {};
+    openLogStream();
     const chatsAD = Alpine.$data(chatsSection);
     chatsAD.selected = id;
 };
@@ -613,8 +659,15 @@ function toggleCssProperty(selector, property, value) {
 
 window.loadChats = async function () {
     try {
-        const fileContents = await readJsonFiles();
-        const response = await sendJsonData("/chat_load", { chats: fileContents });
+        const chatFiles = await selectChatFiles();
+        if (!chatFiles.length) return;
+
+        // upload files as they are, the server reads plain and compressed chats
+        const formData = new FormData();
+        for (const file of chatFiles) formData.append("chats", file);
+        const fetchResponse = await fetch("/chat_load", { method: "POST", body: formData });
+        if (!fetchResponse.ok) throw new Error(await fetchResponse.text());
+        const response = await fetchResponse.json();
 
         if (!response) {
             toast("No response returned.", "error");
@@ -638,20 +691,18 @@ window.loadChats = async function () {
 
 window.saveChat = async function () {
     try {
-        const response = await sendJsonData("/chat_export", { ctxid: context });
-
-        if (!response) {
-            toast("No response returned.", "error");
+        // the server streams the chat file, it is not wrapped in a JSON response
+        const response = await fetch("/chat_export", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ ctxid: context, stream: true }),
+        });
+
+        if (!response.ok) {
+            throw new Error(await response.text());
         }
-        //  else if (!response.ok) {
-        //     if (response.message) {
-        //         toast(response.message, "error")
-        //     } else {
-        //         toast("Undefined error.", "error")
-        //     }
-        // }
         else {
-            downloadFile(response.ctxid + ".json", response.content);
+            downloadFile(context + ".json", await response.blob());
             toast("Chat file downloaded.", "success");
         }
 
@@ -684,42 +735,14 @@ function downloadFile(filename, content) {
 }
 
 
-function readJsonFiles() {
-    return new Promise((resolve, reject) => {
-        // Create an input element of type 'file'
+function selectChatFiles() {
+    return new Promise((resolve) => {
         const input = document.createElement('input');
         input.type = 'file';
-        input.accept = '.json'; // Only accept JSON files
-        input.multiple = true;  // Allow multiple file selection
-
-        // Trigger the file dialog
+        input.accept = '.json,.gz,.zst';
+        input.multiple = true;
+        input.onchange = () => resolve(Array.from(input.files));
         input.click();
-
-        // When files are selected
-        input.onchange = async () => {
-            const files = input.files;
-            if (!files.length) {
-                resolve([]); // Return an empty array if no files are selected
-                return;
-            }
-
-            // Read each file as a string and store in an array
-            const filePromises = Array.from(files).map(file => {
-                return new Promise((fileResolve, fileReject) => {
-                    const reader = new FileReader();
-                    reader.onload = () => fileResolve(reader.result);
-                    reader.onerror = fileReject;
-                    reader.readAsText(file);
-                });
-            });
-
-            try {
-                const fileContents = await Promise.all(filePromises);
-                resolve(fileContents);
-            } catch (error) {
-                reject(error); // In case of any file reading error
-            }
-        };
     });
 }
 
@@ -913,15 +936,46 @@ chatInput.addEventListener('input', adjustTextareaHeight);
 
 // setInterval(poll, 250);
 
+let logStream = null;
+
+function openLogStream() {
+    // server pushes log changes, polling is only used while the stream is not connected
+    if (!window.EventSource) return;
+    if (logStream) logStream.close();
+    const params = new URLSearchParams({
+        context: context || "",
+        log_from: lastLogVersion,
+        log_guid: lastLogGuid
+    });
+    logStream = new EventSource("/log_stream?" + params.toString());
+    logStream.addEventListener("update", (event) => {
+        applyUpdate(JSON.parse(event.data));
+    });
+    logStream.onerror = () => {
+        if (logStream.readyState != EventSource.OPEN) setConnectionStatus(false);
+    };
+}
+
+function isStreaming() {
+    return logStream && logStream.readyState == EventSource.OPEN;
+}
+
 async function startPolling() {
     const shortInterval = 25;
     const longInterval = 250;
     const shortIntervalPeriod = 100;
     let shortIntervalCount = 0;
 
+    openLogStream();
+
     async function _doPoll() {
         let nextInterval = longInterval;
 
+        if (isStreaming()) {
+            setTimeout(_doPoll.bind(this), nextInterval);
+            return;
+        }
+
         try {
             const result = await poll();
             if (result) shortIntervalCount = shortIntervalPeriod; // Reset the counter when the result is true